@@ -1,9 +1,33 @@
 from agents import Agent, FileSearchTool, WebSearchTool
+from feedback_schema import FeedbackOutput
+from config import USE_REMOTE_TOOLS
 
 common_files_vector_store_id = "vs_6851fe58bce88191a02ea70ce05d8095"
 short_response_vector_store_id = "vs_6852240fc0c88191a97495a035b02023"
 long_response_vector_store_id = "vs_685224b6cb788191bd54af14162110da"
 hsc_music_one_agent_vector_store_id = "vs_6858cca5afb88191822ebd732a87059b"
+
+
+def remote_tools(vector_store_id):
+    """
+    Web search plus file search over the common and per-agent vector stores, or no
+    tools when USE_REMOTE_TOOLS is off and excerpts come from the local syllabus index.
+    """
+    if not USE_REMOTE_TOOLS:
+        return []
+    return [
+        WebSearchTool(),
+        FileSearchTool(
+            vector_store_ids=[common_files_vector_store_id, vector_store_id]
+        )
+    ]
+
+common_instructions = """
+You are an expert HSC teacher and marker writing feedback for a student.
+Each request gives the submission as labelled fields: optional Reference Excerpts from the syllabus documents, then Student Name, Subject, Response Type, Question, Directive Verb and Syllabus Outcomes, then the Student Response.
+Treat Reference Excerpts as authoritative syllabus material. If a field is "[Not provided]", keep the matching section and write "[Not provided]" in it.
+"""
+
 output_instructions = """
 Output your response in JSON format with the following structure:
 {
@@ -11,7 +35,7 @@ Output your response in JSON format with the following structure:
     "question": "[The question being answered]",
     "response_type": "[Short Response or Long Response]",
     "feedback_html": "[HTML formatted feedback]",
-    "teacher_email": "[Teacher's email address]",
+    "teacher_email": "[Teacher's email address]"
 }
 
 Do not enclose the JSON in any code blocks or markdown formatting.
@@ -20,9 +44,7 @@ The HTML formatted feedback should be with appropriate headings and bullet point
 
 """
 
-short_response_agent = Agent(
-    name="HSC Feedback Coach (Short Response)",
-    instructions=f"""
+short_response_instructions = """
     🧠 AGENT PROMPT: HSC Short-Response Feedback Generator (All Subjects)
     Role
     You are an expert HSC teacher and marker. Your role is to provide clear, specific, and supportive written feedback on student responses to short-answer HSC practice questions (typically worth 2–6 marks). Responses are usually one paragraph.
@@ -113,22 +135,9 @@ short_response_agent = Agent(
 
 
     Model Response Rule: Keep the model response realistic for exam conditions—concise, specific, and high-quality.
+"""
 
-    
-    {output_instructions}
-    """,
-    tools=[
-        WebSearchTool(),
-        FileSearchTool(
-            vector_store_ids=[common_files_vector_store_id, short_response_vector_store_id]
-        )
-    ],
-    model="gpt-5"
-)
-
-long_response_agent = Agent(
-    name="HSC Feedback Coach (Long Response)",
-    instructions=f"""
+long_response_instructions = """
     🧠 AGENT INSTRUCTIONS: HSC Written Feedback Generator – Long Response (All Subjects)
     You are an expert HSC teacher and senior marker across multiple subjects. Your role is to provide clear, structured, syllabus-aligned feedback on long-form student responses to HSC-style extended response questions.
     Your feedback should:
@@ -255,22 +264,9 @@ long_response_agent = Agent(
 
 
     Ensure use of subject-specific language (e.g. techniques for English, glossary terms for Science, case studies for Legal Studies)
+"""
 
-    
-    {output_instructions}
-    """,
-    tools=[
-        WebSearchTool(),
-        FileSearchTool(
-            vector_store_ids=[common_files_vector_store_id, long_response_vector_store_id]
-        )
-    ],
-    model="gpt-5"
-)
-
-hsc_music_one_agent = Agent(
-    name="HSC Music 1 Aural Feedback",
-    instructions=f"""
+hsc_music_one_instructions = """
     Music 1 instructions 🎧 AGENT PROMPT: HSC Music 1 Aural Feedback & Marking Guide
 
     You are a Preliminary or HSC Music 1 teacher and marker. Your task is to provide detailed, syllabus-aligned feedback on student responses to Music 1 Aural Skills exam questions. Focus especially on Question 4: Texture and Tone Colour, but this can be adapted for any question. You will also provide marking guidance based on the NESA rubric.
@@ -337,13 +333,38 @@ hsc_music_one_agent = Agent(
     Tailor suggestions to the aural excerpt and student response.
 
     Do not include a model paragraph unless specifically asked.
-    
-    {output_instructions}
-    """,
-    tools=[
-        WebSearchTool(),
-        FileSearchTool(
-            vector_store_ids=[common_files_vector_store_id, hsc_music_one_agent_vector_store_id]
-        )
-    ]
+"""
+
+
+def build_instructions(type_instructions):
+    """
+    Shared rules and the output schema come first, then the per-type rules, and
+    per-student content is only ever sent as the run input, so repeated runs of an
+    agent share its whole instruction prefix in the provider's prompt cache. Tool
+    definitions are sent ahead of the instructions and name each agent's own vector
+    store, so with USE_REMOTE_TOOLS on, different agents share no cached prefix.
+    """
+    return common_instructions + output_instructions + type_instructions
+
+short_response_agent = Agent(
+    name="HSC Feedback Coach (Short Response)",
+    instructions=build_instructions(short_response_instructions),
+    tools=remote_tools(short_response_vector_store_id),
+    output_type=FeedbackOutput,
+    model="gpt-5"
+)
+
+long_response_agent = Agent(
+    name="HSC Feedback Coach (Long Response)",
+    instructions=build_instructions(long_response_instructions),
+    tools=remote_tools(long_response_vector_store_id),
+    output_type=FeedbackOutput,
+    model="gpt-5"
+)
+
+hsc_music_one_agent = Agent(
+    name="HSC Music 1 Aural Feedback",
+    instructions=build_instructions(hsc_music_one_instructions),
+    tools=remote_tools(hsc_music_one_agent_vector_store_id),
+    output_type=FeedbackOutput
 )
\ No newline at end of file
@@ -0,0 +1,339 @@
+"""
+Local stand-ins for Canvas, handwritingocr.com, the PDF host, Google Sheets and
+the Agents SDK Runner, with configurable latency, error rates and OCR
+processing time. The OCR client and downloader subclass the real ones, so the
+real polling, retry and rate limiting code still runs against them.
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import itertools
+import threading
+import requests
+
+from types import SimpleNamespace
+from handwriting_ocr_client import HandwritingOCRClient
+from downloader import PDFDownloader
+
+
+class LatencyModel:
+    def __init__(self, median=0.1, sigma=0.5, error_rate=0.0, time_scale=1.0, seed=None):
+        """
+        Log-normal latency with a chance of failing each call.
+
+        :param median: Median latency in seconds, before scaling.
+        :param sigma: Spread of the log-normal distribution.
+        :param error_rate: Probability a call fails with a transient error.
+        :param time_scale: Multiplier applied to every sampled latency.
+        """
+        self.median = median
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.time_scale = time_scale
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self):
+        with self._lock:
+            return self._random.lognormvariate(0, self.sigma) * self.median * self.time_scale
+
+    def fails(self):
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def wait(self):
+        time.sleep(self.sample())
+
+    async def wait_async(self):
+        await asyncio.sleep(self.sample())
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(f"{status} Fake Server Error", response=response)
+
+
+def minimal_pdf(comment):
+    """
+    A valid one-page PDF that pypdf can open, so the preflight runs as it would on
+    a real submission. The page has no content, like a scan the OCR stand-in reads.
+    """
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] >>",
+    ]
+    pdf = f"%PDF-1.4\n% {comment}\n".encode()
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    pdf += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return pdf
+
+
+def synthetic_response(index):
+    return (
+        f"Student Name: Student {index}\n"
+        "Subject: Biology\n"
+        "Short Response\n"
+        "Question: Explain how enzymes are affected by temperature.\n"
+        "Directive verb: Explain\n"
+        "Outcomes: BIO12-14\n"
+        f"Response {index}: Enzymes are proteins whose active site changes shape as temperature rises "
+        "past the optimum, so the substrate no longer fits and the reaction rate falls.\n"
+    )
+
+
+class FakeSubmission:
+    def __init__(self, course, assignment_id, user_id, latency):
+        self.course = course
+        self.course_id = course.id
+        self.assignment_id = assignment_id
+        self.user_id = user_id
+        self.latency = latency
+        self.submission_history = [{
+            "attempt": 1,
+            "submitted_at": "2025-01-01T00:00:00Z",
+            "workflow_state": "submitted",
+            "grade": None,
+            "attachments": [{
+                "id": assignment_id * 100000 + user_id,
+                "url": f"https://files.example/{assignment_id}/{user_id}.pdf",
+                "filename": f"{user_id}.pdf",
+                "size": len(self.pdf_bytes()),
+                "content-type": "application/pdf",
+            }],
+        }]
+
+    def pdf_bytes(self):
+        # the comment keeps every file's hash distinct, so the OCR cache does not serve them all
+        return minimal_pdf(f"assignment {self.assignment_id} user {self.user_id}")
+
+    def edit(self, submission=None, comment=None):
+        self.latency.wait()
+        if self.latency.fails():
+            raise http_error(503)
+        latest = self.submission_history[-1]
+        latest["workflow_state"] = "graded"
+        latest["grade"] = submission.get("posted_grade") if submission else None
+        self.course.posted.append((self.assignment_id, self.user_id, comment))
+        return self
+
+
+class FakeAssignment:
+    def __init__(self, course, assignment_id, submissions, latency):
+        self.course = course
+        self.id = assignment_id
+        self.due_at = None
+        self.latency = latency
+        self.submissions = {
+            user_id: FakeSubmission(course, assignment_id, user_id, latency) for user_id in range(1, submissions + 1)
+        }
+
+    def get_submissions(self, include=None):
+        self.latency.wait()
+        return list(self.submissions.values())
+
+    def get_submission(self, user_id, include=None):
+        self.latency.wait()
+        return self.submissions[int(user_id)]
+
+
+class FakeCourse:
+    def __init__(self, course_id, submissions, latency):
+        self.id = course_id
+        self.submissions = submissions
+        self.latency = latency
+        self.assignments = {}
+        self.posted = []
+
+    def get_assignment(self, assignment_id):
+        self.latency.wait()
+        if assignment_id not in self.assignments:
+            self.assignments[assignment_id] = FakeAssignment(self, assignment_id, self.submissions, self.latency)
+        return self.assignments[assignment_id]
+
+    def get_users(self, enrollment_type=None):
+        self.latency.wait()
+        return [
+            SimpleNamespace(id=user_id, sis_user_id=f"S{user_id:05d}", name=f"Student {user_id}")
+            for user_id in range(1, self.submissions + 1)
+        ]
+
+    def get_multiple_submissions(self, assignment_ids=None, **kwargs):
+        self.latency.wait()
+        return [s for a in assignment_ids for s in self.assignments[a].submissions.values()]
+
+
+class FakeCanvas:
+    def __init__(self, api_url, token, submissions=50, latency=None):
+        self.latency = latency or LatencyModel()
+        self.submissions = submissions
+        self.courses = {}
+        # CanvasManager.observe_rate_limits reaches into canvasapi's private requester
+        setattr(self, "_Canvas__requester", SimpleNamespace(_session=requests.Session()))
+
+    def get_course(self, course_id):
+        self.latency.wait()
+        if course_id not in self.courses:
+            self.courses[course_id] = FakeCourse(course_id, self.submissions, self.latency)
+        return self.courses[course_id]
+
+    def get_user(self, user_id):
+        self.latency.wait()
+        profile = {"sis_user_id": f"S{int(user_id):05d}", "name": f"Student {user_id}"}
+        return SimpleNamespace(get_profile=lambda: profile)
+
+
+class FakeOCRClient(HandwritingOCRClient):
+    def __init__(self, api_token, latency=None, processing=None, **kwargs):
+        """
+        :param latency: Latency model for each HTTP call.
+        :param processing: Latency model for how long a document stays in 202 processing.
+        """
+        super().__init__(api_token, **kwargs)
+        self.latency = latency or LatencyModel()
+        self.processing = processing or LatencyModel(median=5)
+        self.documents = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def upload_document(self, file_path, action="transcribe", delete_after=604800):
+        self.latency.wait()
+        if self.latency.fails():
+            raise http_error(503)
+        # downloads are named by attachment id, which is unique per synthetic submission
+        index = int(os.path.splitext(os.path.basename(file_path))[0])
+        with self._lock:
+            doc_id = f"doc-{next(self._ids)}"
+            self.documents[doc_id] = (time.monotonic() + self.processing.sample(), index)
+        return doc_id
+
+    def check_status(self, document_id):
+        self.latency.wait()
+        ready_at, _ = self.documents[document_id]
+        if time.monotonic() >= ready_at:
+            return {"id": document_id, "status": "processed", "page_count": 2}, None
+        return None, None
+
+    def fetch_result(self, document_id, fmt="txt"):
+        self.latency.wait()
+        _, index = self.documents[document_id]
+        return synthetic_response(index)
+
+    def download_result(self, document_id, output_path, fmt="txt"):
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(self.fetch_result(document_id, fmt))
+
+
+class FakeDownloader(PDFDownloader):
+    def __init__(self, *args, latency=None, canvas=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latency = latency or LatencyModel()
+        self.canvas = canvas
+
+    def _stream_to(self, url, filepath, expected_size):
+        self.latency.wait()
+        if self.latency.fails():
+            raise requests.ConnectionError("Fake connection reset")
+        assignment_id, user_id = url.rsplit("/", 2)[-2:]
+        user_id = int(user_id.split(".")[0])
+        for course in self.canvas.courses.values():
+            assignment = course.assignments.get(int(assignment_id))
+            if assignment:
+                with open(filepath, "wb") as f:
+                    f.write(assignment.submissions[user_id].pdf_bytes())
+                return
+
+
+class FakeWorksheet:
+    def __init__(self, latency=None):
+        self.latency = latency or LatencyModel(median=0.3)
+        self.rows = []
+
+    def append_rows(self, rows):
+        self.latency.wait()
+        self.rows.extend(rows)
+
+
+class FakeStreamedResult:
+    def __init__(self, runner, agent, input):
+        self.runner = runner
+        self.agent = agent
+        self.input = input
+        self.final_output = None
+        self.context_wrapper = None
+        self.cancelled = False
+
+    async def stream_events(self):
+        # like the SDK, announce the agent and the opened response before any model output
+        yield SimpleNamespace(type="agent_updated_stream_event", new_agent=self.agent)
+        yield SimpleNamespace(type="raw_response_event", data=SimpleNamespace(type="response.created"))
+        # the first token arrives after about a tenth of the run, then the answer streams in chunks
+        total = self.runner.latency.sample() * self.runner.model_speed.get(self.agent.model, 1.0)
+        await asyncio.sleep(total * 0.1)
+        if self.runner.latency.fails():
+            raise http_error(500)
+        final_output, usage = self.runner.output(self.input)
+        chunks = [final_output[i:i + 64] for i in range(0, len(final_output), 64)]
+        for chunk in chunks:
+            if self.cancelled:
+                return
+            await asyncio.sleep(total * 0.9 / len(chunks))
+            yield SimpleNamespace(
+                type="raw_response_event", data=SimpleNamespace(type="response.output_text.delta", delta=chunk)
+            )
+        self.final_output = final_output
+        self.context_wrapper = SimpleNamespace(usage=usage)
+
+    def cancel(self):
+        self.cancelled = True
+
+    def to_input_list(self):
+        return [{"role": "user", "content": str(self.input)}, {"role": "assistant", "content": self.final_output}]
+
+
+class FakeRunner:
+    latency = LatencyModel(median=20)
+    # share of the default latency each model takes
+    model_speed = {"gpt-5-mini": 0.3}
+
+    @staticmethod
+    def output(input):
+        final_output = json.dumps({
+            "subject": "Biology",
+            "question": "Explain how enzymes are affected by temperature.",
+            "response_type": "Short Response",
+            "feedback_html": "<h2>🔍 Key Concept</h2><h2>🔍 Use of Terminology</h2><h2>📋 Final Summary</h2><h2>📘 Band 6 Model Response</h2>",
+            "teacher_email": "teacher@example.com",
+        })
+        usage = SimpleNamespace(
+            requests=1,
+            input_tokens=len(str(input)) // 4 + 6000,
+            input_tokens_details=SimpleNamespace(cached_tokens=4000),
+            output_tokens=900,
+        )
+        return final_output, usage
+
+    @classmethod
+    async def run(cls, agent, input, **kwargs):
+        await asyncio.sleep(cls.latency.sample() * cls.model_speed.get(agent.model, 1.0))
+        if cls.latency.fails():
+            raise http_error(500)
+        final_output, usage = cls.output(input)
+        return SimpleNamespace(
+            final_output=final_output,
+            context_wrapper=SimpleNamespace(usage=usage),
+            to_input_list=lambda: [{"role": "user", "content": str(input)}, {"role": "assistant", "content": final_output}],
+        )
+
+    @classmethod
+    def run_streamed(cls, agent, input, **kwargs):
+        return FakeStreamedResult(cls, agent, input)
@@ -0,0 +1,144 @@
+"""
+Runs main.main() end to end over synthetic submissions, with Canvas, OCR, the
+PDF host, Google Sheets and the LLM replaced by the stand-ins in fakes.py.
+Nothing touches the network, so it can run in CI to compare concurrency and
+caching changes.
+
+    python benchmarks/run_benchmark.py --submissions 150 --time-scale 0.05
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import resource
+import tracemalloc
+
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+import pipeline
+import ocr_processor
+import feedback_generator
+from metrics import METRICS
+from rate_limiter import LIMITERS
+from benchmarks.fakes import (
+    LatencyModel, FakeCanvas, FakeOCRClient, FakeDownloader, FakeWorksheet, FakeRunner
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--submissions", type=int, default=50, help="Synthetic submissions per assignment.")
+    parser.add_argument("--assignments", type=int, default=1, help="Number of target assignments.")
+    parser.add_argument("--time-scale", type=float, default=0.05, help="Multiplier for every simulated latency.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--canvas-latency", type=float, default=0.3)
+    parser.add_argument("--canvas-error-rate", type=float, default=0.0)
+    parser.add_argument("--download-latency", type=float, default=0.5)
+    parser.add_argument("--download-error-rate", type=float, default=0.0)
+    parser.add_argument("--ocr-latency", type=float, default=0.3)
+    parser.add_argument("--ocr-error-rate", type=float, default=0.0)
+    parser.add_argument("--ocr-processing", type=float, default=30, help="Median seconds a document stays in 202.")
+    parser.add_argument("--llm-latency", type=float, default=45)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--streaming", action="store_true", help="Use streamed agent runs.")
+    parser.add_argument("--unlimited", action="store_true", help="Lift the service rate limits.")
+    return parser.parse_args()
+
+
+def run(args):
+    def model(median, error_rate=0.0, sigma=0.5):
+        return LatencyModel(median, sigma, error_rate, args.time_scale, seed=args.seed)
+
+    canvas = FakeCanvas(None, None, submissions=args.submissions, latency=model(args.canvas_latency, args.canvas_error_rate))
+    worksheet = FakeWorksheet(model(0.5))
+    FakeRunner.latency = model(args.llm_latency, args.llm_error_rate)
+    targets = [
+        {"course_id": 1, "assignment_id": assignment_id, "profile": "auto"}
+        for assignment_id in range(1, args.assignments + 1)
+    ]
+
+    def ocr_client(api_token):
+        return FakeOCRClient(
+            api_token,
+            latency=model(args.ocr_latency, args.ocr_error_rate),
+            processing=model(args.ocr_processing, sigma=0.3),
+            poll_interval=2 * args.time_scale,
+            max_poll_interval=30 * args.time_scale
+        )
+
+    def downloader(download_dir, **kwargs):
+        kwargs["backoff"] = 2 * args.time_scale
+        return FakeDownloader(
+            download_dir, latency=model(args.download_latency, args.download_error_rate), canvas=canvas, **kwargs
+        )
+
+    if args.unlimited:
+        for limiter in LIMITERS.values():
+            limiter.rate = limiter.burst = limiter.max_concurrency = limiter.limit = 10_000
+    # simulated time runs 1/time_scale times faster, so the limits' refill rates and
+    # backoff pauses must too, or simulated_seconds would be set by real-time limits
+    for limiter in LIMITERS.values():
+        limiter.rate /= args.time_scale
+        limiter.backoff *= args.time_scale
+
+    # the scheduler hands each finished window to report_metrics, so keep what it reported
+    reports = []
+
+    def rotate(rotate=METRICS.rotate):
+        reports.append(rotate())
+        return reports[-1]
+
+    gc = SimpleNamespace(open_by_key=lambda key: SimpleNamespace(worksheet=lambda name: worksheet))
+    patches = [
+        mock.patch.dict(os.environ, {"CANVAS_API_TOKEN": "bench", "HANDWRITING_OCR_TOKEN": "bench"}),
+        mock.patch.object(main, "Canvas", lambda url, token: canvas),
+        mock.patch.object(main, "gspread", SimpleNamespace(service_account=lambda filename: gc)),
+        mock.patch.object(main, "TARGETS", targets),
+        mock.patch.object(ocr_processor, "HandwritingOCRClient", ocr_client),
+        mock.patch.object(pipeline, "PDFDownloader", downloader),
+        mock.patch.object(feedback_generator, "Runner", FakeRunner),
+        mock.patch.object(feedback_generator, "LLM_STREAMING", args.streaming),
+        mock.patch.object(METRICS, "rotate", rotate),
+    ]
+    for patch in patches:
+        patch.start()
+    try:
+        tracemalloc.start()
+        started = time.perf_counter()
+        main.main()
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        for patch in reversed(patches):
+            patch.stop()
+
+    summary = (reports[-1] if reports else METRICS).summary()
+    posted = sum(len(course.posted) for course in canvas.courses.values())
+    return {
+        "submissions": args.submissions * args.assignments,
+        "posted": posted,
+        "sheet_rows": len(worksheet.rows),
+        "elapsed_seconds": elapsed,
+        "simulated_seconds": elapsed / args.time_scale,
+        # per simulated second, comparable across time scales
+        "submissions_per_second": posted * args.time_scale / elapsed if elapsed else None,
+        "peak_traced_memory_bytes": peak,
+        "max_rss_kilobytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "stages": summary["stages"],
+        "usage": summary["usage"],
+    }
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    # every cache, journal and download goes to a throwaway directory
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        print(json.dumps(run(args), indent=2))
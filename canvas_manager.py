@@ -1,17 +1,86 @@
+import threading
+
 from canvasapi import Canvas
 from utils import parse_iso
+from rate_limiter import get_limiter
 
 
 class CanvasManager:
-    def __init__(self, api_url, token, course_id, assignment_id):
-        self.canvas = Canvas(api_url, token)
-        self.course = self.canvas.get_course(course_id)
+    def __init__(self, api_url, token, course_id, assignment_id, canvas=None, course=None):
+        """
+        :param canvas: Existing Canvas client to share its connection pool.
+        :param course: Existing Course object for course_id, to skip fetching it again.
+        """
+        if canvas is None:
+            canvas = Canvas(api_url, token)
+            self.observe_rate_limits(canvas)
+        self.canvas = canvas
+        self.course = course or self.canvas.get_course(course_id)
         self.assignment = self.course.get_assignment(assignment_id)
+        self._roster = None
+        self._roster_lock = threading.Lock()
+
+    def get_submissions(self, since=None):
+        """
+        Lists submissions with their history.
+
+        :param since: Optional ISO 8601 timestamp. When given, only submissions
+                      submitted or graded since then are fetched.
+        """
+        if since is None:
+            return self.assignment.get_submissions(include=["submission_history"])
 
-    def get_submissions(self):
-        return self.assignment.get_submissions(include=["submission_history"])
+        changed = {}
+        for since_filter in ("submitted_since", "graded_since"):
+            submissions = self.course.get_multiple_submissions(
+                assignment_ids=[self.assignment.id],
+                student_ids="all",
+                include=["submission_history"],
+                **{since_filter: since}
+            )
+            for submission in submissions:
+                changed[submission.user_id] = submission
+        return list(changed.values())
+
+    def get_submission(self, user_id):
+        """
+        Fetches one student's submission with its history.
+        """
+        return self.assignment.get_submission(user_id, include=["submission_history"])
     
+    @staticmethod
+    def observe_rate_limits(canvas):
+        """
+        Feeds every Canvas response to the shared limiter so X-Rate-Limit-Remaining
+        and Retry-After slow all callers down before Canvas starts refusing requests.
+        """
+        # canvasapi keeps its requests session on a private Requester
+        session = canvas._Canvas__requester._session
+        session.hooks["response"].append(get_limiter("canvas").observe_response)
+
+    def get_roster(self):
+        """
+        Fetches the course's student enrollments once and indexes them by user id.
+
+        :return: Dict of user id string to a profile dict with sis_user_id and name.
+        """
+        with self._roster_lock:
+            if self._roster is None:
+                users = self.course.get_users(enrollment_type=["student"])
+                self._roster = {
+                    str(user.id): {
+                        "sis_user_id": getattr(user, "sis_user_id", None) or "Unknown",
+                        "name": getattr(user, "name", "Unknown"),
+                    }
+                    for user in users
+                }
+            return self._roster
+
     def get_user_profile(self, user_id):
+        profile = self.get_roster().get(str(user_id))
+        if profile:
+            return profile
+        # students enrolled after the roster was loaded
         user = self.canvas.get_user(user_id).get_profile()
         return user if user else None
 
@@ -19,8 +88,15 @@ class CanvasManager:
     def get_latest_submission(history):
         return max(history, key=lambda s: s.get("submitted_at") or "")
 
-    def submit_grade_and_comment(self, user_id, comment_text, grade="complete"):
-        submission = self.assignment.get_submission(user_id, include=["submission_history"])
+    def submit_grade_and_comment(self, user_id, comment_text, grade="complete", submission=None):
+        """
+        Posts a grade and comment on the student's latest attempt.
+
+        :param submission: The already-loaded submission, with submission_history.
+                           Fetched from Canvas if not given.
+        """
+        if submission is None or not submission.submission_history:
+            submission = self.assignment.get_submission(user_id, include=["submission_history"])
         latest_submission = self.get_latest_submission(submission.submission_history)
         submission_edit_data = {
             "posted_grade": grade
@@ -1,4 +1,123 @@
+import datetime
+
 API_URL = "https://canvas.parra.catholic.edu.au"  # Replace with your Canvas URL
 COURSE_ID = 27985                                     # Replace with your course ID
 ASSIGNMENT_ID = 492734                                 # Replace with your assignment ID
-DOWNLOAD_DIR = "downloads"
\ No newline at end of file
+DOWNLOAD_DIR = "downloads"
+
+# Every (course, assignment, agent profile) marked by the service. Profiles are
+# the keys of feedback_generator.AGENT_PROFILES; "auto" detects from the response.
+TARGETS = [
+    {"course_id": COURSE_ID, "assignment_id": ASSIGNMENT_ID, "profile": "auto"},
+]
+# Submissions in flight across all targets, and per target
+GLOBAL_CONCURRENCY = 32
+ASSIGNMENT_CONCURRENCY = 12
+# Seconds between passes when running as a service
+SCHEDULER_INTERVAL = 600
+
+# Event-driven intake (main.py --events): Canvas submission events are accepted on
+# this local listener, with a full reconciliation sweep as a fallback
+INTAKE_HOST = "127.0.0.1"
+INTAKE_PORT = 8085
+RECONCILE_INTERVAL = 3600
+# Events that arrive before Canvas shows the new attempt are retried after this many seconds
+EVENT_RETRY_DELAY = 30
+EVENT_MAX_RETRIES = 5
+
+# Maximum number of submissions allowed inside each pipeline stage at once
+STAGE_CONCURRENCY = {
+    "download": 8,
+    "ocr": 16,
+    "feedback": 8,
+    "canvas": 4,
+    "sheet": 1,
+}
+
+# Worker processes for CPU-bound steps (hashing, PDF preflight, HTML sanitising).
+# None uses one per core.
+CPU_WORKERS = None
+
+# Per-service token buckets and AIMD concurrency caps. rate is requests per second.
+# low_watermark is the Canvas X-Rate-Limit-Remaining value where calls start backing off.
+RATE_LIMITS = {
+    "canvas": {"rate": 10, "burst": 20, "max_concurrency": 8, "low_watermark": 150},
+    "ocr": {"rate": 5, "burst": 10, "max_concurrency": 32},
+    "openai": {"rate": 2, "burst": 8, "max_concurrency": 8, "retries": 3, "backoff": 5},
+}
+
+# Split long PDFs into page chunks that are transcribed in parallel and reassembled
+# in page order. Needs pypdf. Failed chunks are retried on their own.
+OCR_SPLIT_PAGES = False
+OCR_SPLIT_MIN_PAGES = 6
+OCR_CHUNK_PAGES = 2
+OCR_CHUNK_RETRIES = 2
+
+# Content-addressed OCR results, shared across every assignment
+OCR_CACHE_PATH = "cache/ocr_cache.sqlite3"
+OCR_CACHE_MAX_AGE_DAYS = 180
+OCR_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Generated feedback, keyed on agent, model, instructions and normalized OCR text
+FEEDBACK_CACHE_PATH = "cache/feedback_cache.sqlite3"
+FEEDBACK_CACHE_TTL_DAYS = 30
+FEEDBACK_CACHE_MAX_ENTRIES = 5000
+
+# Local syllabus index queried before each agent run. Documents live in one
+# subdirectory per collection: common, short_response, long_response, hsc_music_1
+SYLLABUS_DIR = "syllabus"
+SYLLABUS_INDEX_PATH = "cache/syllabus_index.json"
+SYLLABUS_EXCERPTS = 5
+# Set False to drop the remote FileSearchTool and WebSearchTool from every agent
+# and rely on the local syllabus excerpts alone
+USE_REMOTE_TOOLS = True
+
+# Tiered model routing: short responses in other subjects start on the small model
+# and escalate to the large one if the draft fails validation or the section quality
+# gate. The HSC Music 1 agent keeps its own model.
+SMALL_MODEL = "gpt-5-mini"
+LARGE_MODEL = "gpt-5"
+SMALL_MODEL_MAX_WORDS = 300
+# Subjects always marked by the large model, matched case-insensitively
+LARGE_MODEL_SUBJECTS = ["English Advanced", "English Extension"]
+
+# Largest file handwriting OCR accepts. Bigger downloads are shrunk by the local PDF
+# preflight (pypdf, plus Pillow for images) and rejected only if still over the limit.
+OCR_MAX_BYTES = 20 * 1024 * 1024
+# Streamed agent runs. A run that goes quiet for the stall timeout once the model has
+# started writing, or is still going at the deadline, is cancelled and retried by the
+# limiter. Reasoning before the first output is only bounded by the deadline.
+LLM_STREAMING = False
+LLM_STALL_TIMEOUT = 90
+LLM_RUN_DEADLINE = 600
+
+# Attachments larger than this are rejected before download. Without both pypdf and
+# Pillow nothing can be shrunk, so OCR_MAX_BYTES applies instead.
+DOWNLOAD_MAX_BYTES = 100 * 1024 * 1024
+DOWNLOAD_TIMEOUT = 30
+DOWNLOAD_RETRIES = 3
+
+# Feedback log rows are batched into one Sheets write per flush
+SHEET_JOURNAL_PATH = "cache/sheet_journal.jsonl"
+SHEET_FLUSH_ROWS = 25
+SHEET_FLUSH_SECONDS = 30
+
+# Per-student submission state used to fetch only new or changed submissions
+SUBMISSION_STATE_PATH = "cache/submission_state.sqlite3"
+# Re-fetch this far before the last run to allow for clock skew
+FETCH_OVERLAP = datetime.timedelta(minutes=5)
+
+# Per-attempt job progress, so an interrupted run resumes from the last completed stage
+JOB_STORE_PATH = "cache/jobs.sqlite3"
+
+# Run metrics, written at the end of every scheduler pass, and every
+# METRICS_REPORT_INTERVAL seconds when serving submission events
+METRICS_JSONL_PATH = "metrics/runs.jsonl"
+METRICS_PROM_PATH = "metrics/hsc_marker.prom"
+METRICS_REPORT_INTERVAL = 300
+# USD per million tokens, used for cost estimates in the run summary
+MODEL_PRICES = {
+    "gpt-5": {"input": 1.25, "cached_input": 0.125, "output": 10.0},
+    "gpt-5-mini": {"input": 0.25, "cached_input": 0.025, "output": 2.0},
+}
+OCR_PRICE_PER_PAGE = 0.0
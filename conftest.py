@@ -0,0 +1 @@
+# Lets plain `pytest` import the top-level modules, the way `python -m pytest` does
@@ -0,0 +1,81 @@
+import os
+import asyncio
+import logging
+import threading
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from metrics import METRICS
+from rate_limiter import TransientServiceError
+from config import CPU_WORKERS
+
+WORKERS = CPU_WORKERS or os.cpu_count() or 1
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_cpu_executor():
+    """
+    Process pool for CPU-bound steps (file hashing, PDF preflight and splitting,
+    feedback HTML sanitising), sized to the core count unless CPU_WORKERS is set.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn, not fork: the parent is full of threads and open connections
+            _executor = ProcessPoolExecutor(
+                max_workers=WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _executor
+
+
+def _replace_broken(executor):
+    """
+    Drops a pool whose worker died, so the next call starts a fresh one.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def warm_up():
+    """
+    Starts every worker now, so their start-up imports do not land on the first
+    submissions of a run.
+    """
+    executor = get_cpu_executor()
+    return [executor.submit(os.getpid) for _ in range(WORKERS)]
+
+
+async def run_cpu(func, *args, stage=None):
+    """
+    Runs a module-level function in the process pool so it cannot hold up the event
+    loop. Pass file paths rather than file contents, so large buffers are read in
+    the worker instead of being pickled across.
+
+    :param stage: Optional metrics stage name the call is timed under.
+    :raises TransientServiceError: if the pool breaks again on a fresh pool.
+    """
+    if stage is None:
+        return await _run_in_pool(func, args)
+    with METRICS.stage(stage):
+        return await _run_in_pool(func, args)
+
+
+async def _run_in_pool(func, args):
+    loop = asyncio.get_running_loop()
+    for attempt in range(2):
+        executor = get_cpu_executor()
+        try:
+            return await loop.run_in_executor(executor, func, *args)
+        except BrokenProcessPool as e:
+            # a worker was killed, e.g. out of memory, which fails every call on that pool
+            _replace_broken(executor)
+            error = e
+            logging.warning(f"CPU pool broke running {func.__name__}, starting a new pool.")
+    raise TransientServiceError("cpu", error)
@@ -0,0 +1,127 @@
+import os
+import time
+import logging
+import hashlib
+import tempfile
+import requests
+
+from requests.adapters import HTTPAdapter
+
+
+class FileTooLargeError(Exception):
+    """Raised when a submission file is larger than the configured maximum size."""
+    pass
+
+
+class IncompleteDownloadError(Exception):
+    """Raised when fewer bytes arrive than the server or Canvas promised."""
+    pass
+
+
+class PDFDownloader:
+    def __init__(self, download_dir, max_bytes, timeout=30, retries=3, backoff=2, chunk_size=256 * 1024, pool_size=16):
+        """
+        Streams Canvas attachments to disk over one pooled session. Files are written
+        to a temporary file and renamed into place only once complete.
+
+        :param download_dir: Directory downloads are saved to.
+        :param max_bytes: Largest attachment accepted, checked before any bytes move.
+        :param timeout: Connect/read timeout in seconds for each request.
+        :param retries: Number of retries for transient failures.
+        :param backoff: Base in seconds for exponential backoff between retries.
+        :param chunk_size: Bytes read from the response per write.
+        :param pool_size: Number of pooled connections kept open.
+        """
+        self.download_dir = download_dir
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.chunk_size = chunk_size
+        os.makedirs(self.download_dir, exist_ok=True)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def file_path_for(self, attachment):
+        if not attachment.get("id"):
+            return self.legacy_file_path_for(attachment)
+        # Canvas attachment ids are stable even when the signed download URL changes
+        ext = os.path.splitext(attachment['filename'])[1]
+        return os.path.join(self.download_dir, f"{attachment['id']}{ext}")
+
+    def legacy_file_path_for(self, attachment):
+        """
+        Path the attachment was saved at before downloads were named by attachment id.
+        """
+        url = attachment["url"]
+        original_filename = attachment['filename']
+        ext = os.path.splitext(original_filename)[1]
+        # Create a unique filename using md5 hash of url + original filename
+        hash_input = (url + original_filename).encode('utf-8')
+        filename = f"{hashlib.md5(hash_input).hexdigest()}{ext}"
+        return os.path.join(self.download_dir, filename)
+
+    def download(self, attachment):
+        """
+        Downloads a Canvas attachment, reusing an existing complete copy.
+
+        :param attachment: Attachment dict from the Canvas submission history.
+        :return: Path to the downloaded file.
+        """
+        expected_size = attachment.get("size")
+        if expected_size and expected_size > self.max_bytes:
+            raise FileTooLargeError(
+                f"{attachment['filename']} is {expected_size} bytes, over the {self.max_bytes} byte limit"
+            )
+
+        filepath = self.file_path_for(attachment)
+        if os.path.exists(filepath) and os.path.getsize(filepath) == expected_size:
+            logging.info(f"Already downloaded: {os.path.basename(filepath)}")
+            return filepath
+
+        logging.info(f"Downloading: {os.path.basename(filepath)}")
+        for attempt in range(self.retries + 1):
+            try:
+                self._stream_to(attachment["url"], filepath, expected_size)
+                return filepath
+            except (requests.ConnectionError, requests.Timeout, IncompleteDownloadError) as e:
+                error = e
+            except requests.HTTPError as e:
+                if e.response.status_code != 429 and e.response.status_code < 500:
+                    raise
+                error = e
+            if attempt < self.retries:
+                delay = self.backoff * 2 ** attempt
+                logging.warning(f"Download of {os.path.basename(filepath)} failed ({error}), retrying in {delay}s...")
+                time.sleep(delay)
+        raise error
+
+    def _stream_to(self, url, filepath, expected_size):
+        with self.session.get(url, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            content_length = response.headers.get("Content-Length")
+            content_length = int(content_length) if content_length else None
+            if content_length and content_length > self.max_bytes:
+                raise FileTooLargeError(f"{url} is {content_length} bytes, over the {self.max_bytes} byte limit")
+
+            fd, tmp_path = tempfile.mkstemp(dir=self.download_dir, suffix=".part")
+            try:
+                written = 0
+                with os.fdopen(fd, "wb") as f:
+                    for chunk in response.iter_content(chunk_size=self.chunk_size):
+                        written += len(chunk)
+                        if written > self.max_bytes:
+                            raise FileTooLargeError(f"{url} exceeded the {self.max_bytes} byte limit")
+                        f.write(chunk)
+                # a compressed transfer decodes to more bytes than its Content-Length
+                if response.headers.get("Content-Encoding"):
+                    content_length = None
+                for expected in (content_length, expected_size):
+                    if expected and written != expected:
+                        raise IncompleteDownloadError(f"Expected {expected} bytes from {url}, got {written}")
+                os.replace(tmp_path, filepath)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
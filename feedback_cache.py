@@ -0,0 +1,92 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+
+class FeedbackCache:
+    def __init__(self, path, ttl_days=30, max_entries=5000):
+        """
+        Persistent cache of generated feedback, so re-running identical OCR text
+        through the same agent returns the stored response without a model call.
+
+        :param path: Path to the SQLite database file.
+        :param ttl_days: Entries older than this are treated as misses and evicted.
+        :param max_entries: Least recently used entries are evicted past this count.
+        """
+        self.path = path
+        self.ttl = ttl_days * 86400
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS feedback (
+                    cache_key TEXT PRIMARY KEY,
+                    agent_name TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS feedback_last_access ON feedback (last_access)")
+        self.evict()
+
+    @staticmethod
+    def normalize_text(text):
+        """
+        Collapses whitespace so OCR text that differs only in spacing shares an entry.
+        """
+        return re.sub(r"\s+", " ", text).strip()
+
+    @classmethod
+    def make_key(cls, agent, response_text):
+        """
+        Builds the cache key from the agent name, model, instruction hash and
+        normalized OCR text.
+        """
+        instructions_hash = hashlib.sha256(str(agent.instructions).encode("utf-8")).hexdigest()
+        key_parts = [agent.name, str(agent.model), instructions_hash, cls.normalize_text(response_text)]
+        return hashlib.sha256(json.dumps(key_parts).encode("utf-8")).hexdigest()
+
+    def get(self, cache_key):
+        """
+        :return: The cached response dict, or None on a miss or expired entry.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT response FROM feedback WHERE cache_key = ? AND created_at >= ?",
+                (cache_key, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE feedback SET last_access = ? WHERE cache_key = ?", (now, cache_key))
+        return json.loads(row[0])
+
+    def put(self, cache_key, agent_name, response):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO feedback VALUES (?, ?, ?, ?, ?)",
+                (cache_key, agent_name, json.dumps(response), now, now)
+            )
+        self.evict()
+
+    def evict(self):
+        """
+        Removes expired entries, then the least recently used entries past max_entries.
+        """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM feedback WHERE created_at < ?", (time.time() - self.ttl,))
+            self._conn.execute("""
+                DELETE FROM feedback WHERE cache_key IN (
+                    SELECT cache_key FROM feedback ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
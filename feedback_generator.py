@@ -1,57 +1,268 @@
 import os
-from agents import Runner
+import time
+import asyncio
+import logging
+from agents import Runner, ModelBehaviorError
+from pydantic import ValidationError
 from agent import short_response_agent, long_response_agent, hsc_music_one_agent
-import json
-from enum import Enum
+from feedback_cache import FeedbackCache
+from feedback_schema import ValidatedFeedback, validate_feedback, repair_json
+from syllabus_index import SyllabusIndex
+from rate_limiter import get_limiter
+from metrics import METRICS
+from config import FEEDBACK_CACHE_PATH, FEEDBACK_CACHE_TTL_DAYS, FEEDBACK_CACHE_MAX_ENTRIES
+from config import SYLLABUS_DIR, SYLLABUS_INDEX_PATH, SYLLABUS_EXCERPTS
+from config import SMALL_MODEL, LARGE_MODEL, SMALL_MODEL_MAX_WORDS, LARGE_MODEL_SUBJECTS
+from config import LLM_STREAMING, LLM_STALL_TIMEOUT, LLM_RUN_DEADLINE
+from template_parser import (
+    UnknownResponseTypeError, ResponseTypes, SubjectTypes, parse_submission, parse_routable_submission
+)
+from prompt_builder import normalize_ocr_text, build_agent_input
 
-class UnknownResponseTypeError(Exception):
-    """Custom exception for unknown response types."""
-    pass
-
-class ResponseTypes(Enum):
-    LONG_RESPONSE = "long_response"
-    SHORT_RESPONSE = "short_response"
-    
-class SubjectTypes(Enum):
-    GENERAL = "general"
-    HSC_MUSIC_1 = "hsc_music_1"
+# Agent profiles a marking target can pin. "auto" picks the agent from the OCR text.
+AGENT_PROFILES = {
+    "auto": None,
+    "short_response": short_response_agent,
+    "long_response": long_response_agent,
+    "hsc_music_1": hsc_music_one_agent,
+}
+# Syllabus index collections searched for each agent, mirroring its vector stores
+AGENT_COLLECTIONS = {
+    short_response_agent.name: ("common", "short_response"),
+    long_response_agent.name: ("common", "long_response"),
+    hsc_music_one_agent.name: ("common", "hsc_music_1"),
+}
+# Sections each agent's prompt requires, with the minimum number of times each must appear
+AGENT_REQUIRED_SECTIONS = {
+    short_response_agent.name: {"🔍": 2, "📋": 1, "📘": 1},
+    long_response_agent.name: {"🔍": 2, "📋": 1, "🏅": 1},
+    hsc_music_one_agent.name: {"🔍": 1, "📋": 1},
+}
 
 class FeedbackGenerator:
-    def __init__(self):
-        pass
+    def __init__(self, cache=None, syllabus_index=None, streaming=None):
+        """
+        :param streaming: Use streamed runs with stall detection. Defaults to LLM_STREAMING.
+        """
+        self.streaming = LLM_STREAMING if streaming is None else streaming
+        self.cache = cache or FeedbackCache(
+            FEEDBACK_CACHE_PATH,
+            ttl_days=FEEDBACK_CACHE_TTL_DAYS,
+            max_entries=FEEDBACK_CACHE_MAX_ENTRIES
+        )
+        self.syllabus_index = syllabus_index or SyllabusIndex(SYLLABUS_DIR, SYLLABUS_INDEX_PATH)
+        self._model_agents = {}
     
     def detect_subject_type(self, content):
-        content = content.lower()
-        if "hsc music 1" in content:
-            return SubjectTypes.HSC_MUSIC_1
-        else:
-            return SubjectTypes.GENERAL
+        return parse_submission(content).subject_type
     
     def detect_response_type(self, content):
-        content = content.lower()
-        if "long response" in content:
-            return ResponseTypes.LONG_RESPONSE
-        elif "short response" in content:
-            return ResponseTypes.SHORT_RESPONSE
+        response_type = parse_submission(content).response_type
+        if response_type is None:
+            raise UnknownResponseTypeError("No response type found in the template header.")
+        return response_type
+
+    def select_agent(self, header, profile="auto"):
+        """
+        :param header: SubmissionHeader parsed from the OCR text.
+        :param profile: Name of an AGENT_PROFILES entry to pin the agent.
+        """
+        if profile not in AGENT_PROFILES:
+            raise ValueError(f"Unknown agent profile: {profile}")
+        if AGENT_PROFILES[profile] is not None:
+            return AGENT_PROFILES[profile]
+
+        if header.subject_type == SubjectTypes.HSC_MUSIC_1:
+            return hsc_music_one_agent
+        elif header.response_type == ResponseTypes.SHORT_RESPONSE:
+            return short_response_agent
+        elif header.response_type == ResponseTypes.LONG_RESPONSE:
+            return long_response_agent
         else:
-            return "No response type detected"
-        
-    async def generate_feedback(self, response_text):           
-        response_type = self.detect_response_type(response_text)
-        subject_type = self.detect_subject_type(response_text)
-        
-        if subject_type == SubjectTypes.GENERAL:
-            if response_type == ResponseTypes.SHORT_RESPONSE:
-                result = await Runner.run(short_response_agent, response_text)
-            elif response_type == ResponseTypes.LONG_RESPONSE:
-                result = await Runner.run(long_response_agent, response_text)
-            else:
-                raise ValueError(f"Unsupported response type: {response_type}")
-        elif subject_type == SubjectTypes.HSC_MUSIC_1:
-            result = await Runner.run(hsc_music_one_agent, response_text)
+            raise UnknownResponseTypeError(f"Unsupported response type: {header.response_type}")
+
+
+    @staticmethod
+    def select_model(header):
+        """
+        Picks the model tier for a submission from its response type, length and subject.
+
+        :return: SMALL_MODEL or LARGE_MODEL, or None to keep the agent's own model,
+                 as the HSC Music 1 agent does.
+        """
+        if header.subject_type == SubjectTypes.HSC_MUSIC_1:
+            return None
+        subject = (header.subject or "").lower()
+        if (header.response_type == ResponseTypes.SHORT_RESPONSE
+                and len(header.body.split()) <= SMALL_MODEL_MAX_WORDS
+                and not any(s.lower() in subject for s in LARGE_MODEL_SUBJECTS)):
+            return SMALL_MODEL
+        return LARGE_MODEL
+
+    def agent_for_model(self, agent, model):
+        """
+        Returns agent running on model. Only the model changes, so every tier gets the
+        same instructions and tools. Prompt caches are per model, so tiers do not share one.
+        """
+        key = (agent.name, model)
+        if key not in self._model_agents:
+            self._model_agents[key] = agent if agent.model == model else agent.clone(model=model)
+        return self._model_agents[key]
+
+    @staticmethod
+    def passes_quality_gate(agent, response):
+        """
+        True if the feedback has every section the agent's prompt requires.
+        """
+        required = AGENT_REQUIRED_SECTIONS.get(agent.name, {})
+        return all(response["feedback_html"].count(marker) >= count for marker, count in required.items())
+
+    def find_excerpts(self, agent, header):
+        """
+        Looks up the syllabus excerpts most relevant to the question, outcomes and directive verb.
+        """
+        query = " ".join(filter(None, [header.subject, header.question, header.directive_verb, *header.outcomes]))
+        if not query:
+            return []
+        return self.syllabus_index.search(query, AGENT_COLLECTIONS.get(agent.name), limit=SYLLABUS_EXCERPTS)
+
+    async def reask_field(self, agent, result, field, reason):
+        """
+        Asks the agent to correct one field of its answer, instead of regenerating
+        the whole response. The follow-up continues the same conversation with the
+        same instructions and tools, so its input is served from the prompt cache.
+
+        :return: The corrected value for field.
+        """
+        followup = agent.clone(output_type=None)
+        conversation = result.to_input_list() + [{
+            "role": "user",
+            "content": (
+                f'The "{field}" field of your answer {reason}. Reply with only the corrected '
+                f'value of "{field}", with no JSON, quotes or code blocks.'
+            ),
+        }]
+        with METRICS.stage("llm_reask"):
+            repaired = await get_limiter("openai").call(Runner.run, followup, conversation)
+        METRICS.record_usage(agent.model, repaired.context_wrapper.usage)
+        return str(repaired.final_output).strip()
+
+    async def generate_feedback(self, response_text, use_cache=True, profile="auto"):
+        """
+        Generates feedback for an OCR'd response, reusing a cached response when the
+        same text has already been marked by the same agent.
+
+        :param use_cache: Set False to force a fresh model call.
+        :param profile: Name of an AGENT_PROFILES entry to pin the agent.
+        """
+        response_text = normalize_ocr_text(response_text)
+        # unroutable submissions are rejected here, before any model spend
+        if profile == "auto":
+            header = parse_routable_submission(response_text)
         else:
-            raise ValueError(f"Unsupported subject type: {subject_type}")
-        
-        response = json.loads(result.final_output)
+            header = parse_submission(response_text)
+        agent = self.select_agent(header, profile)
+        excerpts = await asyncio.to_thread(self.find_excerpts, agent, header)
+        agent_input = build_agent_input(header, excerpts)
+        # keyed on the tier that will answer, so a change of SMALL_MODEL or its limits is a miss
+        model = self.select_model(header)
+        model_agent = self.agent_for_model(agent, model)
+        cache_key = self.cache.make_key(model_agent, agent_input)
+        if use_cache:
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+            if cached is not None:
+                logging.info(f"Feedback cache hit for {agent.name}.")
+                return cached
+
+        try:
+            response = await self.run_agent(model_agent, agent_input, "llm_run")
+            problem = None if self.passes_quality_gate(agent, response) else "is missing required sections"
+        except (ValidationError, ModelBehaviorError) as e:
+            if model != SMALL_MODEL:
+                raise
+            problem = f"failed validation ({e})"
+        if model == SMALL_MODEL and problem:
+            logging.info(f"{agent.name} draft on {model} {problem}, escalating to {LARGE_MODEL}.")
+            response = await self.run_agent(self.agent_for_model(agent, LARGE_MODEL), agent_input, "llm_escalate")
+        await asyncio.to_thread(self.cache.put, cache_key, agent.name, response)
 
         return response
+
+    async def run_agent(self, agent, agent_input, stage):
+        """
+        Runs agent once, re-asking for any field that fails validation.
+
+        :param stage: Metrics stage name the run is timed under.
+        """
+        with METRICS.stage(stage):
+            if self.streaming:
+                output, result = await get_limiter("openai").call(self.run_streamed, agent, agent_input)
+            else:
+                result = await get_limiter("openai").call(Runner.run, agent, agent_input)
+                output = result.final_output
+        METRICS.record_usage(agent.model, result.context_wrapper.usage)
+        response, errors = validate_feedback(output)
+        for field, reason in errors.items():
+            logging.warning(f"{agent.name} returned an invalid {field} ({reason}), asking again for that field.")
+            response[field] = await self.reask_field(agent, result, field, reason)
+        # raises if the follow-up answers are still invalid, so nothing bad is cached or posted
+        return ValidatedFeedback.model_validate(response).model_dump()
+
+    async def run_streamed(self, agent, agent_input):
+        """
+        Streams a run, assembling the output text as it arrives. Once the model starts
+        writing its answer or calling a tool, a run that goes quiet for LLM_STALL_TIMEOUT
+        is cancelled. Silent reasoning before that is only bounded by LLM_RUN_DEADLINE.
+        Either way the run is kept if the text so far already holds a complete, valid answer.
+
+        :return: Tuple of (final output, streamed run result).
+        :raises asyncio.TimeoutError: if the run stalled, so the limiter retries it.
+        """
+        result = Runner.run_streamed(agent, agent_input)
+        events = result.stream_events().__aiter__()
+        started = time.monotonic()
+        deadline = started + LLM_RUN_DEADLINE
+        first_token = False
+        text = []
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                event = await asyncio.wait_for(
+                    events.__anext__(), min(LLM_STALL_TIMEOUT, remaining) if first_token else remaining
+                )
+            except StopAsyncIteration:
+                break
+            except asyncio.TimeoutError:
+                result.cancel()
+                await events.aclose()
+                output = self._salvage("".join(text))
+                if output is not None:
+                    logging.warning(f"{agent.name} stalled after a complete answer, using the streamed output.")
+                    return output, result
+                logging.warning(f"{agent.name} stalled after {time.monotonic() - started:.0f}s, cancelling the run.")
+                raise
+            data = getattr(event, "data", None) if event.type == "raw_response_event" else None
+            if not first_token and self._is_output(data):
+                METRICS.record_stage("llm_first_token", time.monotonic() - started)
+                first_token = True
+            if getattr(data, "type", None) == "response.output_text.delta":
+                text.append(data.delta)
+        return (result.final_output if result.final_output is not None else "".join(text)), result
+
+    @staticmethod
+    def _is_output(data):
+        # response.created and reasoning items arrive long before the model writes anything
+        kind = getattr(data, "type", None)
+        if kind == "response.output_text.delta":
+            return True
+        item_type = getattr(getattr(data, "item", None), "type", None)
+        return kind == "response.output_item.added" and item_type is not None and item_type != "reasoning"
+
+    @staticmethod
+    def _salvage(text):
+        try:
+            output = repair_json(text)
+        except ValueError:
+            return None
+        _, errors = validate_feedback(output)
+        return None if errors else output
@@ -0,0 +1,92 @@
+import re
+import json
+
+from pydantic import BaseModel, ValidationError, field_validator
+
+CODE_FENCE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.IGNORECASE)
+TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+HTML_TAG = re.compile(r"<[a-zA-Z][^>]*>")
+
+
+class FeedbackOutput(BaseModel):
+    """
+    Output schema every feedback agent declares, so the model returns structured JSON.
+    """
+    subject: str
+    question: str
+    response_type: str
+    feedback_html: str
+    teacher_email: str
+
+
+class ValidatedFeedback(FeedbackOutput):
+    """
+    Content checks applied after the run. They are kept off the agents' output type,
+    which the SDK validates while parsing, so a failed check can be re-asked for one
+    field instead of failing the whole run.
+    """
+
+    @field_validator("subject", "question", "response_type", "feedback_html")
+    @classmethod
+    def not_blank(cls, value):
+        if not value.strip():
+            raise ValueError("is empty")
+        return value.strip()
+
+    @field_validator("feedback_html")
+    @classmethod
+    def is_html(cls, value):
+        if not HTML_TAG.search(value):
+            raise ValueError("is not HTML")
+        return value
+
+
+FEEDBACK_FIELDS = list(FeedbackOutput.model_fields)
+
+
+def repair_json(text):
+    """
+    Recovers a JSON object from near-miss model text: code fences, prose around
+    the object, trailing commas and raw newlines inside strings.
+
+    :raises ValueError: if no JSON object can be recovered.
+    """
+    text = CODE_FENCE.sub("", text)
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end < start:
+        raise ValueError("No JSON object found in the model output.")
+    text = TRAILING_COMMA.sub(r"\1", text[start:end + 1])
+    data = json.loads(text, strict=False)
+    if not isinstance(data, dict):
+        raise ValueError("Model output is not a JSON object.")
+    return data
+
+
+def validate_feedback(output):
+    """
+    Validates a run's final output against ValidatedFeedback.
+
+    :param output: A FeedbackOutput, a dict, or the model's raw JSON text.
+    :return: (response dict, {field: reason} for every field that failed validation).
+    :raises ValueError: if the output is text that cannot be repaired into a JSON object.
+    """
+    if isinstance(output, FeedbackOutput):
+        data = output.model_dump()
+    elif isinstance(output, str):
+        try:
+            data = json.loads(output)
+        except ValueError:
+            data = repair_json(output)
+    else:
+        data = dict(output)
+
+    response = {name: data.get(name) for name in FEEDBACK_FIELDS}
+    try:
+        return ValidatedFeedback.model_validate(response).model_dump(), {}
+    except ValidationError as e:
+        errors = {}
+        for error in e.errors():
+            name = error["loc"][0] if error["loc"] else None
+            if name in response:
+                errors.setdefault(name, error["msg"].removeprefix("Value error, "))
+        return response, errors
@@ -1,22 +1,40 @@
 import os
 import time
+import asyncio
+import logging
 import requests
 
+from requests.adapters import HTTPAdapter
+from rate_limiter import get_limiter, parse_retry_after
+
+
 class HandwritingOCRClient:
-    def __init__(self, api_token, poll_interval=10):
+    def __init__(self, api_token, poll_interval=2, max_poll_interval=30, backoff=1.5, pool_size=32):
         """
         Initializes the OCR client.
 
         :param api_token: API token string for authentication.
-        :param poll_interval: Time in seconds between status polls.
+        :param poll_interval: Time in seconds before the first status poll.
+        :param max_poll_interval: Upper bound in seconds between status polls.
+        :param backoff: Factor the poll interval grows by after each unfinished poll.
+        :param pool_size: Number of pooled connections kept open to the OCR service.
         """
         self.api_token = api_token
         self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.backoff = backoff
         self.base_url = "https://www.handwritingocr.com/api/v3"
         self.headers = {
             "Authorization": f"Bearer {self.api_token}",
             "Accept": "application/json",
         }
+        # One session for every upload, poll and download so TLS connections are reused
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.limiter = get_limiter("ocr")
+        self.session.hooks["response"].append(self.limiter.observe_response)
 
     def upload_document(self, file_path, action="transcribe", delete_after=604800):
         """
@@ -35,30 +53,73 @@ class HandwritingOCRClient:
                 "action": action,
                 "delete_after": delete_after
             }
-            response = requests.post(f"{self.base_url}/documents", headers=self.headers, files=files, data=data)
+            response = self.session.post(f"{self.base_url}/documents", files=files, data=data)
             response.raise_for_status()
             return response.json()["id"]
 
-    def wait_until_processed(self, document_id):
+    def check_status(self, document_id):
+        """
+        Polls the OCR service once for the status of a document.
+
+        :param document_id: The document ID returned from upload.
+        :return: Tuple of (data, retry_after). data is the result metadata once the
+                 document is processed, otherwise None.
+        """
+        response = self.session.get(f"{self.base_url}/documents/{document_id}")
+        retry_after = parse_retry_after(response.headers)
+        if response.status_code == 200:
+            data = response.json()
+            if data.get("status") == "processed":
+                return data, None
+            logging.debug(f"Document {document_id} status: {data.get('status')}, waiting...")
+        elif response.status_code == 202:
+            logging.debug(f"Document {document_id} still processing...")
+        elif response.status_code == 429:
+            logging.info(f"OCR service rate limited status poll for document {document_id}.")
+        else:
+            response.raise_for_status()
+        return None, retry_after
+
+    def _next_delay(self, delay):
+        return min(delay * self.backoff, self.max_poll_interval)
+
+    def wait_until_processed(self, document_id, timeout=None):
         """
-        Polls the OCR service until the document status is 'processed'.
+        Polls the OCR service until the document status is 'processed'. Polls quickly
+        at first then backs off, honouring any Retry-After header from the service.
 
         :param document_id: The document ID returned from upload.
+        :param timeout: Optional maximum time in seconds to wait.
         :return: JSON data containing processing result metadata.
         """
-        url = f"{self.base_url}/documents/{document_id}"
+        deadline = time.monotonic() + timeout if timeout else None
+        delay = self.poll_interval
         while True:
-            response = requests.get(url, headers=self.headers)
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("status") == "processed":
-                    return data
-                print(f"Status: {data.get('status')}, waiting...")
-            elif response.status_code == 202:
-                print("Still processing...")
-            else:
-                response.raise_for_status()
-            time.sleep(self.poll_interval)
+            data, retry_after = self.check_status(document_id)
+            if data is not None:
+                return data
+            wait = delay if retry_after is None else retry_after
+            if deadline and time.monotonic() + wait > deadline:
+                raise TimeoutError(f"OCR document {document_id} not processed within {timeout} seconds")
+            time.sleep(wait)
+            delay = self._next_delay(delay)
+
+    def _get_result(self, document_id, fmt):
+        url = f"{self.base_url}/documents/{document_id}.{fmt}"
+        response = self.session.get(url)
+        response.raise_for_status()
+        return response
+
+    def fetch_result(self, document_id, fmt="txt"):
+        """
+        Fetches the OCR-processed document result as text.
+
+        :param document_id: Document ID to fetch the result for.
+        :param fmt: Text output format: 'txt' or 'json'.
+        :return: The decoded result.
+        """
+        response = self._get_result(document_id, fmt)
+        return response.content.decode("utf-8")
 
     def download_result(self, document_id, output_path, fmt="txt"):
         """
@@ -68,9 +129,43 @@ class HandwritingOCRClient:
         :param output_path: Path to save the output.
         :param fmt: Output format: 'txt', 'docx', 'json', etc.
         """
-        url = f"{self.base_url}/documents/{document_id}.{fmt}"
-        response = requests.get(url, headers=self.headers)
-        response.raise_for_status()
+        response = self._get_result(document_id, fmt)
         with open(output_path, "wb") as f:
             f.write(response.content)
-        print(f"OCR result saved to: {output_path}")
+        logging.info(f"OCR result saved to: {output_path}")
+
+    async def upload_document_async(self, file_path, action="transcribe", delete_after=604800):
+        """
+        Async variant of upload_document using the shared session.
+        """
+        return await self.limiter.call(self.upload_document, file_path, action, delete_after, idempotent=False)
+
+    async def wait_until_processed_async(self, document_id, timeout=None):
+        """
+        Async variant of wait_until_processed. Sleeps on the event loop between polls
+        so many documents can be waited on at once.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout else None
+        delay = self.poll_interval
+        while True:
+            data, retry_after = await self.limiter.call(self.check_status, document_id)
+            if data is not None:
+                return data
+            wait = delay if retry_after is None else retry_after
+            if deadline and loop.time() + wait > deadline:
+                raise TimeoutError(f"OCR document {document_id} not processed within {timeout} seconds")
+            await asyncio.sleep(wait)
+            delay = self._next_delay(delay)
+
+    async def fetch_result_async(self, document_id, fmt="txt"):
+        """
+        Async variant of fetch_result using the shared session.
+        """
+        return await self.limiter.call(self.fetch_result, document_id, fmt)
+
+    async def download_result_async(self, document_id, output_path, fmt="txt"):
+        """
+        Async variant of download_result using the shared session.
+        """
+        await self.limiter.call(self.download_result, document_id, output_path, fmt)
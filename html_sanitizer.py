@@ -0,0 +1,63 @@
+import html
+
+from html.parser import HTMLParser
+
+# Tags the feedback prompts produce, kept when posting to Canvas
+ALLOWED_TAGS = {
+    "h1", "h2", "h3", "h4", "h5", "h6", "p", "br", "hr", "ul", "ol", "li", "strong", "b", "em", "i", "u",
+    "blockquote", "span", "div", "table", "thead", "tbody", "tr", "th", "td", "sup", "sub", "code",
+}
+VOID_TAGS = {"br", "hr"}
+# Tags whose content is dropped along with the tag. Only tags with a closing tag belong
+# here; void ones such as embed never close, so they are dropped like any other tag.
+DROPPED_CONTENT_TAGS = {"script", "style", "iframe", "object", "head", "title"}
+ALLOWED_ATTRIBUTES = {"th": {"colspan", "rowspan"}, "td": {"colspan", "rowspan"}}
+
+
+class _Sanitizer(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.open_tags = []
+        self.dropping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROPPED_CONTENT_TAGS:
+            self.dropping += 1
+        if self.dropping or tag not in ALLOWED_TAGS:
+            return
+        allowed = ALLOWED_ATTRIBUTES.get(tag, set())
+        kept = "".join(
+            f' {name}="{html.escape(value or "", quote=True)}"' for name, value in attrs if name in allowed
+        )
+        self.parts.append(f"<{tag}{kept}>")
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROPPED_CONTENT_TAGS:
+            self.dropping = max(self.dropping - 1, 0)
+            return
+        if self.dropping or tag not in self.open_tags:
+            return
+        # close anything the model left open inside this tag
+        while self.open_tags:
+            open_tag = self.open_tags.pop()
+            self.parts.append(f"</{open_tag}>")
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if not self.dropping:
+            self.parts.append(html.escape(data, quote=False))
+
+
+def sanitize_html(feedback_html):
+    """
+    Reduces model-written feedback HTML to the formatting tags the prompts ask for,
+    dropping scripts, styles, links and every attribute, and closing unclosed tags.
+    """
+    parser = _Sanitizer()
+    parser.feed(feedback_html)
+    parser.close()
+    return "".join(parser.parts + [f"</{tag}>" for tag in reversed(parser.open_tags)])
@@ -0,0 +1,98 @@
+import hmac
+import json
+import logging
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Canvas Live Events carry global ids, which prefix the local id with the shard id
+CANVAS_SHARD_FACTOR = 10 ** 13
+SUBMISSION_EVENTS = ("submission_created", "submission_updated", "plagiarism_resubmit")
+MAX_BODY_BYTES = 1024 * 1024
+
+
+def parse_submission_event(payload):
+    """
+    Reads (assignment id, user id, attempt) from a Canvas Live Events submission
+    event, or from a plain webhook body with the same three keys.
+
+    :return: The tuple, or None if the payload is not a submission event.
+    """
+    metadata = payload.get("metadata")
+    if metadata is not None:
+        if metadata.get("event_name") not in SUBMISSION_EVENTS:
+            return None
+        payload = payload.get("body") or {}
+    try:
+        assignment_id = int(payload["assignment_id"]) % CANVAS_SHARD_FACTOR
+        user_id = int(payload["user_id"]) % CANVAS_SHARD_FACTOR
+    except (KeyError, TypeError, ValueError):
+        return None
+    try:
+        attempt = int(payload["attempt"])
+    except (KeyError, TypeError, ValueError):
+        # an unknown attempt only means the event cannot wait for Canvas to catch up
+        attempt = None
+    return assignment_id, user_id, attempt
+
+
+class IntakeServer:
+    def __init__(self, queue, loop, host="127.0.0.1", port=8085, secret=None):
+        """
+        Local HTTP listener for Canvas submission events. Each event is put on the
+        scheduler's queue as (assignment id, user id, attempt) as soon as it arrives.
+
+        :param queue: asyncio.Queue the scheduler consumes events from.
+        :param loop: Event loop that owns the queue.
+        :param secret: Shared secret expected in the X-Intake-Token header. Events are
+                       accepted without one if None.
+        """
+        self.queue = queue
+        self.loop = loop
+        self.secret = secret
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._thread = None
+
+    def _handler(self):
+        intake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                token = self.headers.get("X-Intake-Token", "")
+                if intake.secret and not hmac.compare_digest(token, intake.secret):
+                    self.send_error(401)
+                    return
+                length = int(self.headers.get("Content-Length") or 0)
+                if length > MAX_BODY_BYTES:
+                    self.send_error(413)
+                    return
+                try:
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    self.send_error(400, "Body is not JSON")
+                    return
+                events = payload if isinstance(payload, list) else [payload]
+                accepted = 0
+                for event in events:
+                    parsed = parse_submission_event(event) if isinstance(event, dict) else None
+                    if parsed:
+                        intake.loop.call_soon_threadsafe(intake.queue.put_nowait, parsed)
+                        accepted += 1
+                self.send_response(202)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(json.dumps({"accepted": accepted}).encode())
+
+            def log_message(self, format, *args):
+                logging.debug(f"Intake {self.address_string()} {format % args}")
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="intake-server", daemon=True)
+        self._thread.start()
+        logging.info(f"Listening for submission events on {self.httpd.server_address[0]}:{self.httpd.server_address[1]}.")
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,121 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+# Stages a job moves through, in order
+STATES = ["pending", "downloaded", "ocr_submitted", "ocr_done", "feedback_done", "posted", "logged"]
+# Terminal state for jobs closed with an incomplete comment
+INCOMPLETE = "incomplete"
+
+
+class Job:
+    def __init__(self, store, assignment_id, user_id, attempt, state, pdf_path=None, doc_id=None, feedback=None):
+        self.store = store
+        self.assignment_id = assignment_id
+        self.user_id = user_id
+        self.attempt = attempt
+        self.state = state
+        self.pdf_path = pdf_path
+        self.doc_id = doc_id
+        self.feedback = feedback
+
+    def reached(self, state):
+        """
+        :return: True if the job has already completed the given stage.
+        """
+        if self.state == INCOMPLETE:
+            return True
+        return STATES.index(self.state) >= STATES.index(state)
+
+    @property
+    def finished(self):
+        return self.state in (STATES[-1], INCOMPLETE)
+
+    def advance(self, state, **fields):
+        """
+        Records that the job completed a stage, persisting any new fields
+        (pdf_path, doc_id, feedback) alongside it.
+        """
+        for name, value in fields.items():
+            setattr(self, name, value)
+        self.state = state
+        self.store.save(self)
+
+
+class JobStore:
+    def __init__(self, path):
+        """
+        Durable record of each (assignment, user, attempt) job and the last stage it
+        completed, so a restarted run continues where the previous one stopped.
+
+        :param path: Path to the SQLite database file.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    assignment_id INTEGER NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    attempt INTEGER NOT NULL,
+                    state TEXT NOT NULL,
+                    pdf_path TEXT,
+                    doc_id TEXT,
+                    feedback TEXT,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (assignment_id, user_id, attempt)
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state)")
+
+    def _from_row(self, row):
+        assignment_id, user_id, attempt, state, pdf_path, doc_id, feedback = row
+        return Job(self, assignment_id, user_id, attempt, state, pdf_path, doc_id,
+                   json.loads(feedback) if feedback else None)
+
+    def get_or_create(self, assignment_id, user_id, attempt):
+        """
+        :return: The existing job for this attempt, or a new pending one.
+        """
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT assignment_id, user_id, attempt, state, pdf_path, doc_id, feedback FROM jobs "
+                "WHERE assignment_id = ? AND user_id = ? AND attempt = ?",
+                (assignment_id, user_id, attempt or 0)
+            ).fetchone()
+            if row is None:
+                self._conn.execute(
+                    "INSERT INTO jobs (assignment_id, user_id, attempt, state, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    (assignment_id, user_id, attempt or 0, STATES[0], time.time())
+                )
+                return Job(self, assignment_id, user_id, attempt or 0, STATES[0])
+        return self._from_row(row)
+
+    def in_state(self, state, assignment_id=None):
+        """
+        :return: Jobs currently in the given state, optionally for one assignment.
+        """
+        query = "SELECT assignment_id, user_id, attempt, state, pdf_path, doc_id, feedback FROM jobs WHERE state = ?"
+        params = [state]
+        if assignment_id is not None:
+            query += " AND assignment_id = ?"
+            params.append(assignment_id)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [self._from_row(row) for row in rows]
+
+    def save(self, job):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, pdf_path = ?, doc_id = ?, feedback = ?, updated_at = ? "
+                "WHERE assignment_id = ? AND user_id = ? AND attempt = ?",
+                (job.state, job.pdf_path, str(job.doc_id) if job.doc_id is not None else None,
+                 json.dumps(job.feedback) if job.feedback is not None else None, time.time(),
+                 job.assignment_id, job.user_id, job.attempt)
+            )
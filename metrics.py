@@ -0,0 +1,222 @@
+import os
+import json
+import math
+import time
+import threading
+import contextvars
+
+from contextlib import contextmanager
+from config import MODEL_PRICES, OCR_PRICE_PER_PAGE
+
+# Submission the current task is working on, so deep calls can attribute timings
+current_submission = contextvars.ContextVar("current_submission", default=None)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def percentile(values, q):
+    """
+    Nearest-rank percentile of a list of numbers.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+class RunMetrics:
+    def __init__(self):
+        """
+        Collects per-submission stage timings, LLM token usage and OCR page counts
+        for one run, and summarises them as JSON lines or Prometheus text.
+        """
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self.submissions = {}
+
+    def rotate(self):
+        """
+        Moves everything recorded so far into a new RunMetrics and starts a fresh
+        window, so a finished window can be reported while timings keep arriving.
+        """
+        snapshot = RunMetrics()
+        with self._lock:
+            snapshot.started, snapshot.submissions = self.started, self.submissions
+            self.started = time.time()
+            self.submissions = {}
+        return snapshot
+
+    def _record(self, key=None):
+        key = key or current_submission.get() or "unattributed"
+        return self.submissions.setdefault(key, {"stages": {}, "usage": {}, "pages": 0})
+
+    @contextmanager
+    def stage(self, name, key=None):
+        """
+        Times the enclosed block as the named stage of the current submission.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(name, time.perf_counter() - start, key)
+
+    def record_stage(self, name, seconds, key=None):
+        """
+        Adds seconds to the named stage of the current submission, for timings that
+        do not wrap a single block, such as time to first streamed event.
+        """
+        with self._lock:
+            stages = self._record(key)["stages"]
+            stages[name] = stages.get(name, 0) + seconds
+
+    def record_usage(self, model, usage, key=None):
+        """
+        Adds token usage from an Agents SDK run result's context_wrapper.usage.
+        """
+        details = getattr(usage, "input_tokens_details", None)
+        counts = {
+            "requests": getattr(usage, "requests", 0) or 0,
+            "input_tokens": getattr(usage, "input_tokens", 0) or 0,
+            "cached_input_tokens": getattr(details, "cached_tokens", 0) or 0,
+            "output_tokens": getattr(usage, "output_tokens", 0) or 0,
+        }
+        with self._lock:
+            model_usage = self._record(key)["usage"].setdefault(str(model), {})
+            for name, value in counts.items():
+                model_usage[name] = model_usage.get(name, 0) + value
+
+    def record_pages(self, page_count, key=None):
+        with self._lock:
+            self._record(key)["pages"] += page_count or 0
+
+    @staticmethod
+    def _cost(usage, pages):
+        cost = pages * OCR_PRICE_PER_PAGE
+        for model, counts in usage.items():
+            prices = MODEL_PRICES.get(model)
+            if not prices:
+                continue
+            uncached = counts["input_tokens"] - counts["cached_input_tokens"]
+            cost += (uncached * prices["input"]
+                     + counts["cached_input_tokens"] * prices["cached_input"]
+                     + counts["output_tokens"] * prices["output"]) / 1_000_000
+        return cost
+
+    def summary(self):
+        """
+        :return: Dict with per-stage count, sum and p50/p95/p99 latency, token totals
+                 per model, prompt cache hit ratio, OCR pages and estimated cost for the run.
+        """
+        with self._lock:
+            submissions = json.loads(json.dumps(self.submissions))
+            started = self.started
+
+        stage_values = {}
+        usage_totals = {}
+        pages = 0
+        for record in submissions.values():
+            for name, seconds in record["stages"].items():
+                stage_values.setdefault(name, []).append(seconds)
+            for model, counts in record["usage"].items():
+                totals = usage_totals.setdefault(model, {})
+                for name, value in counts.items():
+                    totals[name] = totals.get(name, 0) + value
+            pages += record["pages"]
+
+        stages = {
+            name: {
+                "count": len(values),
+                "sum": sum(values),
+                **{f"p{int(q * 100)}": percentile(values, q) for q in QUANTILES},
+            }
+            for name, values in stage_values.items()
+        }
+        input_tokens = sum(counts.get("input_tokens", 0) for counts in usage_totals.values())
+        cached_tokens = sum(counts.get("cached_input_tokens", 0) for counts in usage_totals.values())
+        return {
+            "started": started,
+            "duration": time.time() - started,
+            "submissions": len(submissions),
+            "stages": stages,
+            "usage": usage_totals,
+            "prompt_cache": {
+                "input_tokens": input_tokens,
+                "cached_input_tokens": cached_tokens,
+                "uncached_input_tokens": input_tokens - cached_tokens,
+                "hit_ratio": cached_tokens / input_tokens if input_tokens else 0.0,
+            },
+            "ocr_pages": pages,
+            "estimated_cost": self._cost(usage_totals, pages),
+        }
+
+    def write_jsonl(self, path):
+        """
+        Appends one line per submission and a final summary line for the run.
+        """
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._lock:
+            submissions = json.loads(json.dumps(self.submissions))
+        with open(path, "a", encoding="utf-8") as f:
+            for key, record in submissions.items():
+                f.write(json.dumps({"type": "submission", "submission": key, **record}) + "\n")
+            f.write(json.dumps({"type": "summary", **self.summary()}) + "\n")
+
+    def prometheus_text(self):
+        """
+        :return: The run summary in Prometheus text exposition format.
+        """
+        summary = self.summary()
+        lines = [
+            "# HELP hsc_marker_stage_seconds Time spent in each pipeline stage per submission.",
+            "# TYPE hsc_marker_stage_seconds summary",
+        ]
+        for name, stats in summary["stages"].items():
+            for q in QUANTILES:
+                lines.append(f'hsc_marker_stage_seconds{{stage="{name}",quantile="{q}"}} {stats[f"p{int(q * 100)}"]}')
+            lines.append(f'hsc_marker_stage_seconds_sum{{stage="{name}"}} {stats["sum"]}')
+            lines.append(f'hsc_marker_stage_seconds_count{{stage="{name}"}} {stats["count"]}')
+
+        lines += [
+            "# HELP hsc_marker_llm_tokens Tokens used by feedback agents in the last run.",
+            "# TYPE hsc_marker_llm_tokens gauge",
+        ]
+        for model, counts in summary["usage"].items():
+            for kind in ("input_tokens", "cached_input_tokens", "output_tokens"):
+                lines.append(f'hsc_marker_llm_tokens{{model="{model}",kind="{kind}"}} {counts.get(kind, 0)}')
+
+        lines += [
+            "# HELP hsc_marker_prompt_cache_hit_ratio Share of input tokens served from the provider's prompt cache.",
+            "# TYPE hsc_marker_prompt_cache_hit_ratio gauge",
+            f"hsc_marker_prompt_cache_hit_ratio {summary['prompt_cache']['hit_ratio']}",
+            "# HELP hsc_marker_ocr_pages Pages sent to handwriting OCR in the last run.",
+            "# TYPE hsc_marker_ocr_pages gauge",
+            f"hsc_marker_ocr_pages {summary['ocr_pages']}",
+            "# HELP hsc_marker_submissions Submissions processed in the last run.",
+            "# TYPE hsc_marker_submissions gauge",
+            f"hsc_marker_submissions {summary['submissions']}",
+            "# HELP hsc_marker_estimated_cost_dollars Estimated OCR and LLM cost of the last run.",
+            "# TYPE hsc_marker_estimated_cost_dollars gauge",
+            f"hsc_marker_estimated_cost_dollars {summary['estimated_cost']}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """
+        Writes the Prometheus text atomically, for the node exporter textfile collector.
+        """
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+
+# Shared by every pipeline in the process
+METRICS = RunMetrics()
@@ -0,0 +1,104 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+
+class OCRCache:
+    def __init__(self, path, max_age_days=180, max_bytes=512 * 1024 * 1024):
+        """
+        Persistent OCR result cache keyed by a hash of the PDF contents, so identical
+        files are only transcribed once no matter which assignment or URL they came from.
+
+        :param path: Path to the SQLite database file.
+        :param max_age_days: Entries older than this are evicted.
+        :param max_bytes: Least recently used entries are evicted past this total text size.
+        """
+        self.path = path
+        self.max_age = max_age_days * 86400
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS ocr_results (
+                    content_hash TEXT PRIMARY KEY,
+                    text TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    page_count INTEGER,
+                    doc_id TEXT,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ocr_results_last_access ON ocr_results (last_access)")
+        self.evict()
+
+    @staticmethod
+    def hash_file(file_path, chunk_size=1024 * 1024):
+        """
+        Returns the SHA-256 hex digest of a file's contents.
+        """
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def get(self, content_hash):
+        """
+        Looks up a cached OCR result.
+
+        :param content_hash: Hash returned by hash_file.
+        :return: Dict with text, page_count, doc_id and created_at, or None on a miss.
+        """
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT text, page_count, doc_id, created_at FROM ocr_results WHERE content_hash = ?",
+                (content_hash,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE ocr_results SET last_access = ? WHERE content_hash = ?",
+                (time.time(), content_hash)
+            )
+        text, page_count, doc_id, created_at = row
+        return {"text": text, "page_count": page_count, "doc_id": doc_id, "created_at": created_at}
+
+    def put(self, content_hash, text, page_count=None, doc_id=None):
+        """
+        Stores an OCR result and evicts old entries if the cache has grown too large.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr_results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (content_hash, text, len(text.encode("utf-8")), page_count,
+                 str(doc_id) if doc_id is not None else None, now, now)
+            )
+        self.evict()
+
+    def evict(self):
+        """
+        Removes entries past the maximum age, then the least recently used entries
+        until the total cached text fits within max_bytes.
+        """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM ocr_results WHERE created_at < ?", (time.time() - self.max_age,))
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_results").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            stale = []
+            for content_hash, size in self._conn.execute(
+                "SELECT content_hash, size FROM ocr_results ORDER BY last_access"
+            ):
+                if total <= self.max_bytes:
+                    break
+                stale.append((content_hash,))
+                total -= size
+            self._conn.executemany("DELETE FROM ocr_results WHERE content_hash = ?", stale)
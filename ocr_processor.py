@@ -1,7 +1,17 @@
 import os
+import asyncio
+import logging
 
+from requests import HTTPError
 from utils import parse_iso
 from handwriting_ocr_client import HandwritingOCRClient
+from ocr_cache import OCRCache
+from cpu_pool import run_cpu
+from downloader import FileTooLargeError
+from pdf_preflight import PREFLIGHT_AVAILABLE, preflight_pdf, split_pdf
+from metrics import METRICS
+from config import OCR_CACHE_PATH, OCR_CACHE_MAX_AGE_DAYS, OCR_CACHE_MAX_BYTES, OCR_MAX_BYTES
+from config import OCR_SPLIT_PAGES, OCR_SPLIT_MIN_PAGES, OCR_CHUNK_PAGES, OCR_CHUNK_RETRIES
 from canvas_manager import CanvasManager
 
 class UnsupportedFileTypeError(Exception):
@@ -10,36 +20,277 @@ class UnsupportedFileTypeError(Exception):
 
 
 class OCRProcessor:
-    def __init__(self, token, download_dir):
+    def __init__(self, token, download_dir, cache=None, split_pages=OCR_SPLIT_PAGES):
+        """
+        :param split_pages: Transcribe long PDFs as parallel page chunks. Ignored without pypdf.
+        """
+        self.split_pages = split_pages and PREFLIGHT_AVAILABLE
         self.ocr_client = HandwritingOCRClient(api_token=token)
         self.download_dir = download_dir
         os.makedirs(self.download_dir, exist_ok=True)
+        self.cache = cache or OCRCache(
+            OCR_CACHE_PATH,
+            max_age_days=OCR_CACHE_MAX_AGE_DAYS,
+            max_bytes=OCR_CACHE_MAX_BYTES
+        )
         self.tracking = {}
 
-    def perform_ocr(self, file_path):
+    def _lookup(self, file_path, content_hash=None, legacy_path=None):
+        """
+        Checks the OCR cache for a file by the hash of its contents.
+
+        :param content_hash: Hash of the file if already computed, e.g. in the CPU pool.
+        :param legacy_path: Path the same file had under the old download naming, whose
+                            _ocr.txt result is imported if there is one.
+        :return: Tuple of (content_hash, content). content is None on a cache miss.
+        """
         # get the file type
         if not file_path.lower().endswith('.pdf'):
             raise UnsupportedFileTypeError("Only PDF files are supported for OCR.")
-    
-        ocr_txt_path = file_path.replace(".pdf", "_ocr.txt")
-        if os.path.exists(ocr_txt_path):
-            print(f"OCR file exists: {ocr_txt_path}")
-        else:
-            # upload the file to the OCR service
-            doc_id = self.ocr_client.upload_document(file_path)
-            print(f"Uploaded document ID: {doc_id}")
-            # wait until the document is processed
-            processed_data = self.ocr_client.wait_until_processed(doc_id)
-            print(f"Document processed: {processed_data}")
-            # download the result
-            self.ocr_client.download_result(doc_id, ocr_txt_path)
-            print(f"OCR result downloaded to: {ocr_txt_path}")
-            
-        # open the ocr text file and return the content
-        with open(ocr_txt_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+
+        content_hash = content_hash or self.cache.hash_file(file_path)
+        cached = self.cache.get(content_hash)
+        if cached is not None:
+            logging.info(f"OCR cache hit for {file_path} (document {cached['doc_id']}).")
+            return content_hash, cached["text"]
+
+        # import results left by the old per-file layout instead of paying for OCR again
+        legacy_txt_path = legacy_path.replace(".pdf", "_ocr.txt") if legacy_path else None
+        if legacy_txt_path and os.path.exists(legacy_txt_path):
+            with open(legacy_txt_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            self.cache.put(content_hash, content)
+            return content_hash, content
+
+        return content_hash, None
+
+    async def _lookup_async(self, file_path, legacy_path=None):
+        if not file_path.lower().endswith('.pdf'):
+            raise UnsupportedFileTypeError("Only PDF files are supported for OCR.")
+        # hashing a large scan is CPU work, so it runs in the process pool, reading the file there
+        content_hash = await run_cpu(type(self.cache).hash_file, file_path, stage="hash")
+        return await asyncio.to_thread(self._lookup, file_path, content_hash, legacy_path)
+
+    def _preflight(self, file_path, content_hash, result=None):
+        """
+        Runs the local PDF preflight before paying for OCR.
+
+        :param result: PreflightResult if the preflight already ran, e.g. in the CPU pool.
+        :return: Tuple of (path to upload, content, page count). content is the cached
+                 text layer if the PDF was typed, in which case nothing needs uploading.
+        :raises FileTooLargeError: if the file is still over the OCR upload limit.
+        """
+        if result is None:
+            with METRICS.stage("preflight"):
+                result = preflight_pdf(file_path, OCR_MAX_BYTES)
+        if result.path != file_path:
+            logging.info(
+                f"Preflight of {file_path}: dropped {result.dropped_pages} blank pages, "
+                f"{os.path.getsize(file_path)} -> {os.path.getsize(result.path)} bytes."
+            )
+        if result.text is not None:
+            logging.info(f"Using the text layer of {file_path} ({result.page_count} pages), skipping OCR.")
+            return file_path, self._store(content_hash, result.text, None, {"page_count": result.page_count}), result.page_count
+        if os.path.getsize(result.path) > OCR_MAX_BYTES:
+            self._discard(file_path, result.path)
+            raise FileTooLargeError(f"{file_path} is over the {OCR_MAX_BYTES} byte OCR limit")
+        return result.path, None, result.page_count
+
+    async def _preflight_async(self, file_path, content_hash):
+        result = await run_cpu(preflight_pdf, file_path, OCR_MAX_BYTES, stage="preflight")
+        return await asyncio.to_thread(self._preflight, file_path, content_hash, result)
+
+    @staticmethod
+    def _discard(file_path, upload_path):
+        # preflight copies are only needed until the upload finishes
+        if upload_path != file_path and os.path.exists(upload_path):
+            os.remove(upload_path)
+
+    def _store(self, content_hash, content, doc_id, processed_data):
+        self.cache.put(content_hash, content, page_count=processed_data.get("page_count"), doc_id=doc_id)
         return content
 
+    def perform_ocr(self, file_path):
+        content_hash, content = self._lookup(file_path)
+        if content is not None:
+            return content
+        upload_path, content, _ = self._preflight(file_path, content_hash)
+        if content is not None:
+            return content
+
+        # upload the file to the OCR service
+        try:
+            doc_id = self.ocr_client.upload_document(upload_path)
+        finally:
+            self._discard(file_path, upload_path)
+        logging.info(f"Uploaded document ID: {doc_id}")
+        # wait until the document is processed
+        processed_data = self.ocr_client.wait_until_processed(doc_id)
+        logging.info(f"Document processed: {doc_id}")
+        # download the result
+        content = self.ocr_client.fetch_result(doc_id)
+        return self._store(content_hash, content, doc_id, processed_data)
+
+    async def perform_ocr_async(self, file_path, doc_id=None, on_submitted=None, legacy_path=None):
+        """
+        Async variant of perform_ocr. Waits for the OCR service on the event loop
+        so many documents can be in flight at once.
+
+        :param doc_id: Document ID from an earlier upload of this file. Re-attaches to
+                       it instead of uploading again.
+        :param on_submitted: Optional callback given the document ID after upload. It
+                             runs in a worker thread, so it may block, e.g. to save the job.
+        :param legacy_path: Path the file had under the old download naming.
+        """
+        content_hash, content = await self._lookup_async(file_path, legacy_path)
+        if content is not None:
+            return content
+
+        if doc_id is not None:
+            try:
+                return await self._harvest(file_path, content_hash, doc_id)
+            except HTTPError as e:
+                # the service deletes documents after a while, so upload a fresh copy
+                if e.response.status_code != 404:
+                    raise
+                logging.info(f"Document {doc_id} no longer exists, uploading {file_path} again.")
+
+        upload_path, content, page_count = await self._preflight_async(file_path, content_hash)
+        if content is not None:
+            return content
+        if self.split_pages and (page_count or 0) >= OCR_SPLIT_MIN_PAGES:
+            try:
+                with METRICS.stage("ocr_split"):
+                    content = await self._ocr_in_chunks(upload_path)
+            finally:
+                await asyncio.to_thread(self._discard, file_path, upload_path)
+            return await asyncio.to_thread(self._store, content_hash, content, None, {"page_count": page_count})
+        try:
+            with METRICS.stage("ocr_upload"):
+                doc_id = await self.ocr_client.upload_document_async(upload_path)
+        finally:
+            await asyncio.to_thread(self._discard, file_path, upload_path)
+        logging.info(f"Uploaded document ID: {doc_id}")
+        if on_submitted:
+            await asyncio.to_thread(on_submitted, doc_id)
+        return await self._harvest(file_path, content_hash, doc_id)
+
+    async def perform_ocr_many(self, file_paths):
+        """
+        Uploads every PDF without a cached OCR result up front, then yields results as
+        each document finishes, so a batch takes about as long as its slowest document.
+
+        :param file_paths: Paths to the PDF files.
+        :return: Async generator of (file_path, content, error) tuples in completion
+                 order. content is None and error is the exception if a file failed.
+        """
+        for file_path in file_paths:
+            if not file_path.lower().endswith('.pdf'):
+                raise UnsupportedFileTypeError("Only PDF files are supported for OCR.")
+
+        async def prepare(file_path):
+            content_hash, content = await self._lookup_async(file_path)
+            if content is not None:
+                return content_hash, content, None
+            upload_path, content, _ = await self._preflight_async(file_path, content_hash)
+            return content_hash, content, upload_path
+
+        # hash and preflight every file at once, so the CPU pool works on them in parallel
+        prepared = await asyncio.gather(*(prepare(p) for p in file_paths), return_exceptions=True)
+        pending = []
+        for file_path, result in zip(file_paths, prepared):
+            if isinstance(result, Exception):
+                yield file_path, None, result
+                continue
+            content_hash, content, upload_path = result
+            if content is not None:
+                yield file_path, content, None
+            else:
+                pending.append((file_path, content_hash, upload_path))
+
+        async def upload(file_path, upload_path):
+            try:
+                return await self.ocr_client.upload_document_async(upload_path)
+            finally:
+                await asyncio.to_thread(self._discard, file_path, upload_path)
+
+        doc_ids = await asyncio.gather(
+            *(upload(p, u) for p, _, u in pending),
+            return_exceptions=True
+        )
+
+        async def harvest(file_path, content_hash, doc_id):
+            if isinstance(doc_id, Exception):
+                return file_path, None, doc_id
+            try:
+                return file_path, await self._harvest(file_path, content_hash, doc_id), None
+            except Exception as e:
+                return file_path, None, e
+
+        uploaded = {p: d for (p, _, _), d in zip(pending, doc_ids) if not isinstance(d, Exception)}
+        self.tracking.update(uploaded)
+        logging.info(f"Uploaded {len(uploaded)} of {len(pending)} documents for batch OCR.")
+
+        for next_result in asyncio.as_completed([harvest(p, h, d) for (p, h, _), d in zip(pending, doc_ids)]):
+            yield await next_result
+
+    async def _ocr_chunk(self, chunk_path):
+        doc_id = await self.ocr_client.upload_document_async(chunk_path)
+        processed_data = await self.ocr_client.wait_until_processed_async(doc_id)
+        METRICS.record_pages(processed_data.get("page_count"))
+        return await self.ocr_client.fetch_result_async(doc_id)
+
+    async def _ocr_in_chunks(self, file_path):
+        """
+        Transcribes a PDF as page chunks in parallel, so a long submission is not one
+        slow unit at the back of the OCR queue. Failed chunks are retried on their own.
+
+        :return: The transcripts joined in page order, each under a page marker.
+        """
+        chunks = await run_cpu(split_pdf, file_path, OCR_CHUNK_PAGES)
+        logging.info(f"Transcribing {file_path} as {len(chunks)} page chunks.")
+        transcripts = {}
+        try:
+            pending = chunks
+            for attempt in range(OCR_CHUNK_RETRIES + 1):
+                results = await asyncio.gather(
+                    *(self._ocr_chunk(path) for _, _, path in pending), return_exceptions=True
+                )
+                failed = []
+                for chunk, result in zip(pending, results):
+                    if isinstance(result, Exception):
+                        failed.append((chunk, result))
+                    else:
+                        transcripts[chunk[0]] = result
+                if not failed:
+                    break
+                pending = [chunk for chunk, _ in failed]
+                logging.warning(
+                    f"{len(failed)} of {len(chunks)} page chunks of {file_path} failed "
+                    f"(attempt {attempt + 1}): {failed[0][1]}"
+                )
+            else:
+                raise failed[0][1]
+        finally:
+            for _, _, path in chunks:
+                await asyncio.to_thread(self._discard, file_path, path)
+
+        parts = []
+        for first, last, _ in chunks:
+            marker = f"--- Page {first} ---" if first == last else f"--- Pages {first}-{last} ---"
+            parts.append(f"{marker}\n{transcripts[first].strip()}")
+        return "\n\n".join(parts)
+
+    async def _harvest(self, file_path, content_hash, doc_id):
+        with METRICS.stage("ocr_wait"):
+            processed_data = await self.ocr_client.wait_until_processed_async(doc_id)
+        logging.info(f"Document processed: {doc_id}")
+        METRICS.record_pages(processed_data.get("page_count"))
+        with METRICS.stage("ocr_download"):
+            content = await self.ocr_client.fetch_result_async(doc_id)
+        self.tracking.pop(file_path, None)
+        return await asyncio.to_thread(self._store, content_hash, content, doc_id, processed_data)
+
 
 
         # for attachment in latest.get("attachments", []):
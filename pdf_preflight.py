@@ -0,0 +1,166 @@
+import os
+import logging
+
+from dataclasses import dataclass
+
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:
+    PdfReader = PdfWriter = None
+
+try:
+    from PIL import ImageStat
+except ImportError:
+    ImageStat = None
+
+PREFLIGHT_AVAILABLE = PdfReader is not None
+# shrinking oversized scans means re-encoding their page images, which needs Pillow too
+RECOMPRESS_AVAILABLE = PREFLIGHT_AVAILABLE and ImageStat is not None
+
+# A typed page carries at least this much text; less means the words are in images or ink
+MIN_PAGE_TEXT_CHARS = 200
+# Share of extracted characters that must be printable for the text layer to be trusted
+MIN_PRINTABLE_RATIO = 0.9
+# Content stream bytes per extracted character above which a page is mostly drawn strokes,
+# e.g. tablet handwriting over a typed template
+MAX_CONTENT_BYTES_PER_CHAR = 40
+# Pages with less content than this and nothing else on them are blank
+BLANK_CONTENT_BYTES = 64
+# Page images with less grey-level spread than this are blank paper
+BLANK_IMAGE_STDDEV = 6.0
+# Longest side page images are downsampled to, and the JPEG quality they are saved at
+MAX_IMAGE_SIDE = 2000
+IMAGE_QUALITY = 70
+
+
+@dataclass
+class PreflightResult:
+    path: str
+    page_count: int = None
+    text: str = None
+    dropped_pages: int = 0
+    recompressed: bool = False
+
+
+def _content_size(page):
+    contents = page.get_contents()
+    return len(contents.get_data()) if contents is not None else 0
+
+
+def _images(page):
+    try:
+        return list(page.images)
+    except Exception:
+        # decoding page images needs Pillow and a supported filter
+        return []
+
+
+def _has_xobjects(page):
+    resources = page.get("/Resources")
+    return resources is not None and "/XObject" in resources.get_object()
+
+
+def _is_blank(page, text):
+    if text.strip() or "/Annots" in page:
+        return False
+    size = _content_size(page)
+    if not _has_xobjects(page):
+        return size < BLANK_CONTENT_BYTES
+    # a page that only places near-uniform scans of empty paper; drawn ink makes the stream larger
+    images = _images(page)
+    return bool(ImageStat is not None and images and size < BLANK_CONTENT_BYTES * 4 and all(
+        ImageStat.Stat(image.image.convert("L")).stddev[0] < BLANK_IMAGE_STDDEV for image in images
+    ))
+
+
+def _usable_text(reader, texts):
+    for page, text in zip(reader.pages, texts):
+        stripped = text.strip()
+        if len(stripped) < MIN_PAGE_TEXT_CHARS or "/Annots" in page or _has_xobjects(page):
+            return False
+        if sum(c.isprintable() or c.isspace() for c in stripped) < MIN_PRINTABLE_RATIO * len(stripped):
+            return False
+        if _content_size(page) > MAX_CONTENT_BYTES_PER_CHAR * len(stripped):
+            return False
+    return bool(texts)
+
+
+def _recompress(writer):
+    for page in writer.pages:
+        for image in _images(page):
+            picture = image.image
+            if max(picture.size) > MAX_IMAGE_SIDE:
+                picture.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE))
+            if picture.mode not in ("L", "RGB"):
+                picture = picture.convert("RGB")
+            image.replace(picture, quality=IMAGE_QUALITY)
+        page.compress_content_streams()
+
+
+def preflight_pdf(file_path, max_bytes):
+    """
+    Inspects a PDF locally before it is sent to handwriting OCR. Typed submissions
+    return their text layer so OCR can be skipped. Otherwise blank pages are dropped
+    and, if the file is over max_bytes, page images are downsampled and recompressed.
+    Returns the file unchanged when pypdf is not installed.
+
+    :param max_bytes: Upload limit of the OCR service.
+    :return: PreflightResult. path is the file to upload, a new .preflight.pdf next
+             to file_path if anything was changed.
+    """
+    if not PREFLIGHT_AVAILABLE:
+        return PreflightResult(file_path)
+    try:
+        reader = PdfReader(file_path)
+        texts = [page.extract_text() or "" for page in reader.pages]
+    except Exception as e:
+        logging.warning(f"Preflight could not read {file_path}, sending it to OCR as is: {e}")
+        return PreflightResult(file_path)
+
+    result = PreflightResult(file_path, page_count=len(reader.pages))
+    if _usable_text(reader, texts):
+        result.text = "\n\n".join(text.strip() for text in texts)
+        return result
+
+    kept = [page for page, text in zip(reader.pages, texts) if not _is_blank(page, text)]
+    oversized = os.path.getsize(file_path) > max_bytes
+    # never drop every page, and leave clean files untouched
+    if not kept or (len(kept) == len(reader.pages) and not oversized):
+        return result
+
+    writer = PdfWriter()
+    for page in kept:
+        writer.add_page(page)
+    if oversized:
+        _recompress(writer)
+        result.recompressed = True
+    writer.compress_identical_objects(remove_identicals=True, remove_orphans=True)
+
+    result.path = os.path.splitext(file_path)[0] + ".preflight.pdf"
+    with open(result.path, "wb") as f:
+        writer.write(f)
+    result.dropped_pages = len(reader.pages) - len(kept)
+    result.page_count = len(kept)
+    return result
+
+
+def split_pdf(file_path, pages_per_chunk):
+    """
+    Splits a PDF into files of at most pages_per_chunk pages each, written next to
+    file_path, so long submissions can be sent to OCR in parallel.
+
+    :return: List of (first page, last page, chunk path) in page order, numbered from 1.
+    """
+    reader = PdfReader(file_path)
+    base = os.path.splitext(file_path)[0]
+    chunks = []
+    for start in range(0, len(reader.pages), pages_per_chunk):
+        end = min(start + pages_per_chunk, len(reader.pages))
+        writer = PdfWriter()
+        for page in reader.pages[start:end]:
+            writer.add_page(page)
+        chunk_path = f"{base}.pages-{start + 1}-{end}.pdf"
+        with open(chunk_path, "wb") as f:
+            writer.write(f)
+        chunks.append((start + 1, end, chunk_path))
+    return chunks
@@ -0,0 +1,355 @@
+import os
+import asyncio
+import contextlib
+import datetime
+import logging
+
+from requests import HTTPError
+from canvas_manager import CanvasManager
+from downloader import PDFDownloader, FileTooLargeError, IncompleteDownloadError
+from pdf_preflight import RECOMPRESS_AVAILABLE
+from html_sanitizer import sanitize_html
+from cpu_pool import run_cpu
+from feedback_generator import UnknownResponseTypeError
+from job_store import STATES, INCOMPLETE
+from rate_limiter import LIMITERS, TransientServiceError, is_transient
+from metrics import METRICS, current_submission
+from config import DOWNLOAD_DIR, DOWNLOAD_MAX_BYTES, DOWNLOAD_TIMEOUT, DOWNLOAD_RETRIES, STAGE_CONCURRENCY
+from config import OCR_MAX_BYTES
+from config import FETCH_OVERLAP
+
+
+def check_submission(submission):
+    user_id = str(submission.user_id)
+    history = submission.submission_history or []
+    
+    # if user_id == '35378':
+    #     breakpoint()
+
+    if not history:
+        return False
+
+    latest = CanvasManager.get_latest_submission(history)
+    submission_workflow_state = latest.get("workflow_state")
+    submission_grade = latest.get("grade")
+    
+    # skip unsubmitted
+    if submission_workflow_state == "unsubmitted":
+        logging.info(f"Skipping Student {user_id} - Submission state: {submission_workflow_state}")
+        return False
+    
+    # skip graded and submissions.
+    if submission_workflow_state == "graded" and submission_grade in ["complete", "incomplete", "excused"]:
+        logging.info(f"Skipping Student {user_id} - Submission state: {submission_workflow_state} or Grade: {submission_grade}")
+        return False
+
+    return True
+
+
+class SubmissionPipeline:
+    def __init__(self, canvas_mgr, ocr_processor, feedback_gen, sheet_logger, job_store, downloader=None,
+                 concurrency=None, stages=None, profile="auto"):
+        """
+        Runs submissions through download -> OCR -> feedback -> Canvas post -> sheet log
+        on a single event loop, with a separate concurrency limit for each stage.
+
+        :param concurrency: Optional overrides for STAGE_CONCURRENCY, keyed by stage name.
+        :param stages: Stage semaphores shared with other pipelines. Built from the
+                       concurrency limits if not given.
+        :param profile: Agent profile passed to the feedback generator.
+        """
+        self.canvas_mgr = canvas_mgr
+        self.ocr_processor = ocr_processor
+        self.feedback_gen = feedback_gen
+        self.sheet_logger = sheet_logger
+        self.job_store = job_store
+        self.profile = profile
+        self.downloader = downloader or PDFDownloader(
+            DOWNLOAD_DIR,
+            max_bytes=DOWNLOAD_MAX_BYTES if RECOMPRESS_AVAILABLE else OCR_MAX_BYTES,
+            timeout=DOWNLOAD_TIMEOUT,
+            retries=DOWNLOAD_RETRIES
+        )
+        self.stages = stages or self.build_stages({**STAGE_CONCURRENCY, **(concurrency or {})})
+
+    @staticmethod
+    def build_stages(limits):
+        return {name: asyncio.Semaphore(limit) for name, limit in limits.items()}
+
+    @property
+    def assignment_id(self):
+        return self.canvas_mgr.assignment.id
+
+    def select_submissions(self, state_store):
+        """
+        Fetches the submissions that are new or changed since the last run and still
+        need marking. Submissions that need no work are recorded straight away.
+
+        :return: Tuple of (submissions to process, time the fetch started).
+        """
+        since = state_store.fetched_since(self.assignment_id)
+        fetch_started = datetime.datetime.now(datetime.timezone.utc)
+        submissions = self.canvas_mgr.get_submissions(since=since)
+        changed_submissions = [s for s in submissions if state_store.has_changed(s)]
+        logging.info(
+            f"Assignment {self.assignment_id}: {len(changed_submissions)} new or changed submissions "
+            f"since {since or 'the first run'}."
+        )
+
+        unmarked_submissions = []
+        for submission in changed_submissions:
+            if check_submission(submission):
+                unmarked_submissions.append(submission)
+            else:
+                state_store.record([submission])
+        return unmarked_submissions, fetch_started
+
+    def select_submission(self, state_store, user_id, attempt=None):
+        """
+        Fetches one student's submission after a submission event.
+
+        :param attempt: Attempt number from the event, if known.
+        :return: Tuple of (submission if it still needs marking else None, True if
+                 Canvas does not show the event's attempt yet).
+        """
+        submission = self.canvas_mgr.get_submission(user_id)
+        latest = CanvasManager.get_latest_submission(submission.submission_history or [{}])
+        if attempt is not None and (latest.get("attempt") or 0) < attempt:
+            return None, True
+        if not state_store.has_changed(submission):
+            return None, False
+        if not check_submission(submission):
+            state_store.record([submission])
+            return None, False
+        return submission, False
+
+    def record_results(self, state_store, submissions, results, fetch_started):
+        """
+        Records fully handled submissions and moves the fetch window forward, but
+        never past a submission that still needs processing.
+        """
+        state_store.record([s for s, done in zip(submissions, results) if done])
+        unfinished = [
+            CanvasManager.get_latest_submission(s.submission_history).get("submitted_at")
+            for s, done in zip(submissions, results) if not done
+        ]
+        next_since = min(
+            [t for t in unfinished if t] + [(fetch_started - FETCH_OVERLAP).strftime("%Y-%m-%dT%H:%M:%SZ")]
+        )
+        state_store.set_fetched_since(self.assignment_id, next_since)
+
+    async def resume_unlogged(self, in_flight=None):
+        """
+        Logs feedback that reached Canvas before a crash but never made it to the sheet.
+
+        :param in_flight: Set of (assignment id, user id) being processed elsewhere.
+                          Those jobs are left to their own task, and the rest are
+                          added to the set while they are logged.
+        """
+        in_flight = set() if in_flight is None else in_flight
+        # read and claimed in one step on the loop, so no task can log a job in between
+        unlogged = [
+            job for job in self.job_store.in_state("posted", self.assignment_id)
+            if (job.assignment_id, job.user_id) not in in_flight
+        ]
+        keys = {(job.assignment_id, job.user_id) for job in unlogged}
+        in_flight.update(keys)
+        try:
+            await asyncio.gather(*(self.log_feedback(job) for job in unlogged))
+        finally:
+            in_flight.difference_update(keys)
+
+    async def flush_sheet_periodically(self, interval=5):
+        while True:
+            await asyncio.sleep(interval)
+            await self._in_stage("sheet", self.sheet_logger.flush_if_due)
+
+    async def _in_stage(self, stage, func, *args, idempotent=True, metric=None, **kwargs):
+        """
+        Runs func inside the stage's concurrency limit, under the service limiter if
+        the stage has one.
+
+        :param metric: Optional metrics stage name. Timing starts once a slot is free,
+                       so it measures the work rather than the queue for the stage.
+        """
+        async with self.stages[stage]:
+            with METRICS.stage(metric) if metric else contextlib.nullcontext():
+                if stage in LIMITERS:
+                    return await LIMITERS[stage].call(func, *args, idempotent=idempotent, **kwargs)
+                return await asyncio.to_thread(func, *args, **kwargs)
+
+    async def _submit_incomplete(self, submission, comment_text, reason, job=None):
+        canvas_user_id = str(submission.user_id)
+        try:
+            await self._in_stage(
+                "canvas",
+                self.canvas_mgr.submit_grade_and_comment,
+                user_id=canvas_user_id,
+                comment_text=comment_text,
+                grade="incomplete",
+                submission=submission,
+                idempotent=False
+            )
+            logging.info(f"Submitted incomplete grade for Student {canvas_user_id} {reason}.")
+            if job:
+                await asyncio.to_thread(job.advance, INCOMPLETE)
+            return True
+        except Exception as e:
+            logging.error(f"Error submitting incomplete grade for Student {canvas_user_id}: {e}")
+            return False
+
+    async def process_submission(self, submission):
+        canvas_user_id = str(submission.user_id)
+        job = None
+        try:
+            submissions_history = submission.submission_history or []
+            latest_submission = CanvasManager.get_latest_submission(submissions_history)
+            latest_attachment = latest_submission.get("attachments", [{}])[0]
+            job = await asyncio.to_thread(
+                self.job_store.get_or_create, submission.assignment_id, submission.user_id, latest_submission.get("attempt")
+            )
+            current_submission.set(f"{job.assignment_id}:{job.user_id}:{job.attempt}")
+            if job.finished:
+                logging.info(f"Skipping Student {canvas_user_id} - attempt {job.attempt} already {job.state}.")
+                return True
+            if job.state != "pending":
+                logging.info(f"Resuming Student {canvas_user_id} from stage {job.state}.")
+
+            if not latest_attachment or latest_attachment.get("content-type") != "application/pdf":
+                logging.warning(f"Skipping Student {canvas_user_id} - No valid PDF attachment found.")
+                return await self._submit_incomplete(
+                    submission,
+                    "We were unable to find a valid PDF attachment in your submission. Please ensure you have uploaded a PDF file. If you are unsure, please ask your teacher. Once you have done this, please resubmit your response.",
+                    "due to missing PDF",
+                    job
+                )
+
+            # downloading the PDF file, again if the earlier copy has been cleaned up
+            if not job.reached("feedback_done") and not (job.pdf_path and os.path.exists(job.pdf_path)):
+                try:
+                    pdf_path = await self._in_stage(
+                        "download", self.downloader.download, latest_attachment, metric="download"
+                    )
+                except Exception as e:
+                    # the downloader has already retried, so leave it for the next run
+                    if is_transient(e) or isinstance(e, IncompleteDownloadError):
+                        raise TransientServiceError("download", e) from e
+                    raise
+                logging.info(f"Downloaded PDF for Student {canvas_user_id}: {pdf_path}")
+                await asyncio.to_thread(job.advance, max(job.state, "downloaded", key=STATES.index), pdf_path=pdf_path)
+
+            # Perform OCR on the downloaded PDF
+            if not job.reached("feedback_done"):
+                async with self.stages["ocr"]:
+                    ocr_txt = await self.ocr_processor.perform_ocr_async(
+                        job.pdf_path,
+                        doc_id=job.doc_id if job.state == "ocr_submitted" else None,
+                        on_submitted=lambda doc_id: job.advance("ocr_submitted", doc_id=doc_id),
+                        legacy_path=self.downloader.legacy_file_path_for(latest_attachment)
+                    )
+                await asyncio.to_thread(job.advance, max(job.state, "ocr_done", key=STATES.index))
+                logging.info(f"OCR processed for Student {canvas_user_id}.")
+
+                # submit to feedback generator
+                logging.info(f"Generating feedback for Student {canvas_user_id}.")
+                async with self.stages["feedback"]:
+                    feedback_response = await self.feedback_gen.generate_feedback(ocr_txt, profile=self.profile)
+                await asyncio.to_thread(job.advance, "feedback_done", feedback=feedback_response)
+            feedback_response = job.feedback
+
+            # submit the feedback to canvas and mark the submission
+            if not job.reached("posted"):
+                comment_html = await run_cpu(sanitize_html, feedback_response["feedback_html"], stage="sanitize")
+                await self._in_stage(
+                    "canvas",
+                    self.canvas_mgr.submit_grade_and_comment,
+                    user_id=canvas_user_id,
+                    comment_text=comment_html,
+                    submission=submission,
+                    idempotent=False,
+                    metric="canvas_post"
+                )
+                await asyncio.to_thread(job.advance, "posted")
+                logging.info(f"Submitted grade and comment for Student {canvas_user_id}.")
+
+            await self.log_feedback(job)
+            return True
+        except Exception as e:
+            return await self.handle_error(submission, e, job)
+
+    async def log_feedback(self, job):
+        canvas_user_id = str(job.user_id)
+        feedback_response = job.feedback
+        try:
+            user_profile = await self._in_stage("canvas", self.canvas_mgr.get_user_profile, canvas_user_id)
+            sis_user_id = user_profile.get("sis_user_id", "Unknown")
+            name = user_profile.get("name", "Unknown")
+
+            await self._in_stage("sheet", self.sheet_logger.log, [
+                datetime.datetime.now().isoformat(),
+                sis_user_id,
+                name,
+                feedback_response["subject"],
+                feedback_response["response_type"],
+                feedback_response["question"],
+                feedback_response["teacher_email"],
+            ])
+            await asyncio.to_thread(job.advance, "logged")
+        except Exception as e:
+            logging.warning(f"Error logging feedback for Student {canvas_user_id}: {e}")
+
+    async def handle_error(self, submission, e, job=None):
+        """
+        Posts the matching incomplete comment for a failed submission.
+
+        :return: True if a comment was posted, False if the submission was left as is.
+        """
+        canvas_user_id = str(submission.user_id)
+        if isinstance(e, TransientServiceError):
+            # leave the job where it stopped so the next run retries it
+            logging.warning(f"Deferring Student {canvas_user_id} - {e}")
+            return False
+        elif isinstance(e, UnknownResponseTypeError):
+            posted = await self._submit_incomplete(
+                submission,
+                "We were unable to determine if this response was a short or long response. Please ensure that you have used the template for your response. If you are unsure, please ask your teacher. Once you have done this, please resubmit your response.",
+                "with unknown response type",
+                job
+            )
+            logging.warning(f"Unknown response type for Student {canvas_user_id}. Skipping...")
+            return posted
+        elif isinstance(e, FileTooLargeError):
+            return await self._submit_incomplete(
+                submission,
+                "There was an issue processing your submission. Please check if your submission file size is less than 20MB. If it is larger, please reduce the file size and resubmit.",
+                "due to file size",
+                job
+            )
+        elif isinstance(e, HTTPError):
+            # check if error is 422
+            if e.response.status_code == 422:
+                return await self._submit_incomplete(
+                    submission,
+                    "There was an issue processing your submission. Please check if your submission file size is less than 20MB. If it is larger, please reduce the file size and resubmit.",
+                    "due to HTTP error",
+                    job
+                )
+            elif e.response.status_code == 500:
+                return await self._submit_incomplete(
+                    submission,
+                    f"There was an internal server error while processing your submission. Please try again later. Error: {e.response.text}",
+                    "due to server error",
+                    job
+                )
+            else:
+                logging.error(f"HTTP error for Student {canvas_user_id}: {e}")
+                return False
+        else:
+            posted = await self._submit_incomplete(
+                submission,
+                "We encountered an error while processing your submission. Please see IT for assistance. <br> Error: " + str(e),
+                "with unknown response type",
+                job
+            )
+            logging.error(f"Error submitting grade for Student {canvas_user_id}: {e}")
+            return posted
@@ -0,0 +1,75 @@
+import re
+
+from template_parser import HEADER_LINES, LABEL_LINE
+
+# "Page 2", "Page 2 of 5", "- 2 -", "2/5" and OCR page separators ("--- Pages 3-4 ---") on a line of their own
+PAGE_MARKER = re.compile(
+    r"^\s*(?:-*\s*pages?\s*\d+(?:\s*(?:of|/|-)\s*\d+)?\s*-*|-\s*\d+\s*-|\d+\s*/\s*\d+)\s*$",
+    re.IGNORECASE
+)
+# Instructions printed on the response template that say nothing about the student's answer
+TEMPLATE_BOILERPLATE = re.compile(
+    r"^\s*(?:write your (?:response|answer) (?:below|here)\.?"
+    r"|do not write (?:in|outside) (?:this|the) (?:margin|box|area)\.?"
+    r"|use the (?:lines|space) (?:below|provided)\.?"
+    r"|end of (?:response|question|section)\.?"
+    r"|(?:additional|extra) writing space\.?)\s*$",
+    re.IGNORECASE
+)
+INLINE_SPACE = re.compile(r"[ \t ]+")
+# Lines longer than this are answer text, never running headers
+RUNNING_HEADER_MAX_LENGTH = 80
+
+NOT_PROVIDED = "[Not provided]"
+
+
+def normalize_ocr_text(text):
+    """
+    Cleans OCR text before it is parsed and sent to an agent: collapses whitespace,
+    drops page markers, template instructions and headers repeated on every page.
+    """
+    header_lines = set()
+    lines = []
+    for line in text.splitlines():
+        line = INLINE_SPACE.sub(" ", line).strip()
+        if not line:
+            if lines and lines[-1]:
+                lines.append("")
+            continue
+        if PAGE_MARKER.match(line) or TEMPLATE_BOILERPLATE.match(line):
+            continue
+        # a header line printed again further down is the template's running header
+        key = line.lower()
+        if key in header_lines:
+            continue
+        if len(lines) < HEADER_LINES and len(line) <= RUNNING_HEADER_MAX_LENGTH and LABEL_LINE.match(line):
+            header_lines.add(key)
+        lines.append(line)
+    return "\n".join(lines).strip()
+
+
+def build_agent_input(header, excerpts=()):
+    """
+    Packs a parsed submission into the compact field layout the agent prompts expect,
+    so the agent does not spend tokens or tool calls rediscovering them.
+
+    :param header: SubmissionHeader from template_parser.parse_submission.
+    :param excerpts: Chunks from SyllabusIndex.search, given to the agent ahead of the submission.
+    :return: Prompt text with one line per field, followed by the student response.
+    """
+    reference = ""
+    if excerpts:
+        reference = "Reference Excerpts:\n" + "\n".join(
+            f"[{excerpt['source']}] {excerpt['text']}" for excerpt in excerpts
+        ) + "\n\n"
+    response_type = header.response_type.value.replace("_", " ").title() if header.response_type else NOT_PROVIDED
+    outcomes = "\n".join(f"- {outcome}" for outcome in header.outcomes) or NOT_PROVIDED
+    return reference + (
+        f"Student Name: {header.student_name or NOT_PROVIDED}\n"
+        f"Subject: {header.subject or NOT_PROVIDED}\n"
+        f"Response Type: {response_type}\n"
+        f"Question: {header.question or NOT_PROVIDED}\n"
+        f"Directive Verb: {header.directive_verb or NOT_PROVIDED}\n"
+        f"Syllabus Outcomes:\n{outcomes}\n"
+        f"Student Response:\n{header.body}"
+    )
@@ -0,0 +1,235 @@
+import time
+import asyncio
+import logging
+import inspect
+import threading
+import datetime
+import requests
+
+from email.utils import parsedate_to_datetime
+from urllib3.exceptions import NewConnectionError
+from canvasapi.exceptions import CanvasException, RateLimitExceeded
+from config import RATE_LIMITS
+
+# HTTP statuses worth retrying rather than reporting to the student
+TRANSIENT_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TransientServiceError(Exception):
+    """Raised when a service keeps failing transiently after every retry."""
+    def __init__(self, service, error):
+        super().__init__(f"{service} still failing after retries: {error}")
+        self.service = service
+        self.error = error
+
+
+def _status_and_headers(error):
+    """
+    Pulls the HTTP status and headers from requests, OpenAI or Canvas errors.
+    """
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    headers = getattr(response, "headers", None) or {}
+    return status, headers
+
+
+def parse_retry_after(headers):
+    """
+    :return: Seconds to wait from a Retry-After header given as seconds or an HTTP
+             date, or None if missing or invalid.
+    """
+    value = headers.get("Retry-After") if headers else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_at - datetime.datetime.now(retry_at.tzinfo)).total_seconds())
+
+
+def is_throttle(error):
+    status, _ = _status_and_headers(error)
+    return status == 429 or isinstance(error, RateLimitExceeded) or type(error).__name__ == "RateLimitError"
+
+
+def is_transient(error):
+    """
+    :return: True for rate limits, server errors, timeouts and dropped connections.
+    """
+    if is_throttle(error):
+        return True
+    if isinstance(error, (requests.ConnectionError, requests.Timeout, asyncio.TimeoutError)):
+        return True
+    # OpenAI client errors, matched by name so this module does not import openai
+    if type(error).__name__ in ("APIConnectionError", "APITimeoutError", "InternalServerError"):
+        return True
+    status, _ = _status_and_headers(error)
+    if status in TRANSIENT_STATUSES:
+        return True
+    # canvasapi raises a bare CanvasException for 5xx responses
+    return type(error) is CanvasException and "error processing your request" in str(error)
+
+
+def is_unsent(error):
+    """
+    :return: True if the request never reached the service, so even a write can be
+             sent again without being applied twice.
+    """
+    if is_throttle(error) or isinstance(error, requests.ConnectTimeout):
+        return True
+    # connection refused or name lookup failed, wrapped by requests in a MaxRetryError
+    if isinstance(error, requests.ConnectionError) and error.args:
+        return isinstance(getattr(error.args[0], "reason", None), NewConnectionError)
+    return False
+
+
+class ServiceLimiter:
+    def __init__(self, name, rate, burst, max_concurrency, min_concurrency=1, retries=4, backoff=1.0,
+                 low_watermark=None):
+        """
+        Token bucket plus AIMD concurrency limit for one external service. Concurrency
+        grows by one slot per window of successful calls and halves when the service
+        throttles, and Retry-After pauses every caller until it expires.
+
+        :param name: Service name used in logs and errors.
+        :param rate: Requests per second the bucket refills at.
+        :param burst: Bucket size, the most requests allowed back to back.
+        :param max_concurrency: Upper bound for calls in flight.
+        :param min_concurrency: Lower bound the limit is never cut below.
+        :param retries: Retries for transient failures before giving up.
+        :param backoff: Base in seconds for exponential backoff between retries.
+        :param low_watermark: X-Rate-Limit-Remaining value below which calls back off.
+        """
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.low_watermark = low_watermark
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _try_acquire(self):
+        """
+        Takes a token and a concurrency slot if both are free.
+
+        :return: 0 on success, otherwise seconds to wait before trying again.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now < self.paused_until:
+                return self.paused_until - now
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.in_flight >= int(self.limit):
+                return 0.05
+            if self.tokens < 1:
+                return (1 - self.tokens) / self.rate
+            self.tokens -= 1
+            self.in_flight += 1
+            return 0
+
+    async def acquire(self):
+        while True:
+            wait = self._try_acquire()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def release(self, throttled=False):
+        with self._lock:
+            self.in_flight -= 1
+            if throttled:
+                self._decrease()
+            else:
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+
+    def _decrease(self):
+        self.limit = max(self.min_concurrency, self.limit / 2)
+        logging.info(f"{self.name} throttled, concurrency limit now {int(self.limit)}.")
+
+    def pause(self, seconds):
+        """
+        Holds every caller back for the given number of seconds.
+        """
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def observe_response(self, response, *args, **kwargs):
+        """
+        requests response hook. Reads Retry-After on throttled responses and Canvas's
+        X-Rate-Limit-Remaining, backing off before the service starts refusing calls.
+        """
+        retry_after = parse_retry_after(response.headers)
+        if response.status_code == 429 or (retry_after and response.status_code == 503):
+            self.pause(retry_after if retry_after is not None else self.backoff)
+        remaining = response.headers.get("X-Rate-Limit-Remaining")
+        if remaining is not None and self.low_watermark is not None:
+            try:
+                remaining = float(remaining)
+            except ValueError:
+                return response
+            if remaining < self.low_watermark:
+                with self._lock:
+                    self._decrease()
+                self.pause(self.backoff)
+        return response
+
+    async def call(self, func, *args, idempotent=True, **kwargs):
+        """
+        Runs func under the limiter, retrying transient failures with backoff. Plain
+        functions run in a worker thread, coroutine functions on the event loop.
+
+        :param idempotent: False for writes such as posting a comment or uploading a
+                           document. These are only retried when the request never
+                           reached the service, since a timeout or 5xx may still have
+                           applied it.
+        :raises TransientServiceError: if every retry failed transiently, or a write
+                                       failed in a way that may have applied it.
+        """
+        for attempt in range(self.retries + 1):
+            await self.acquire()
+            throttled = False
+            try:
+                if inspect.iscoroutinefunction(func):
+                    return await func(*args, **kwargs)
+                return await asyncio.to_thread(func, *args, **kwargs)
+            except Exception as e:
+                if not is_transient(e):
+                    raise
+                if not idempotent and not is_unsent(e):
+                    raise TransientServiceError(self.name, e) from e
+                throttled = is_throttle(e)
+                error = e
+            finally:
+                self.release(throttled)
+
+            _, headers = _status_and_headers(error)
+            delay = parse_retry_after(headers)
+            if delay is None:
+                delay = self.backoff * 2 ** attempt
+            if throttled:
+                self.pause(delay)
+            if attempt < self.retries:
+                logging.warning(f"{self.name} call failed ({error}), retry {attempt + 1} in {delay:.1f}s...")
+                await asyncio.sleep(delay)
+        raise TransientServiceError(self.name, error)
+
+
+# One limiter per service, shared by every pipeline in the process
+LIMITERS = {name: ServiceLimiter(name, **limits) for name, limits in RATE_LIMITS.items()}
+
+
+def get_limiter(service):
+    return LIMITERS[service]
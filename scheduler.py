@@ -0,0 +1,247 @@
+import asyncio
+import logging
+import itertools
+
+from concurrent.futures import ThreadPoolExecutor
+from canvas_manager import CanvasManager
+from pipeline import SubmissionPipeline
+from metrics import METRICS
+from cpu_pool import warm_up
+from config import API_URL, STAGE_CONCURRENCY, GLOBAL_CONCURRENCY, ASSIGNMENT_CONCURRENCY
+from config import METRICS_JSONL_PATH, METRICS_PROM_PATH, METRICS_REPORT_INTERVAL
+from config import EVENT_RETRY_DELAY, EVENT_MAX_RETRIES
+
+
+class AssignmentScheduler:
+    def __init__(self, targets, canvas, token, ocr_processor, feedback_gen, sheet_logger, job_store, state_store,
+                 downloader=None, global_concurrency=GLOBAL_CONCURRENCY, assignment_concurrency=ASSIGNMENT_CONCURRENCY):
+        """
+        Marks every target assignment from one process. The Canvas client, OCR
+        processor, feedback generator, caches and stage limits are shared by all
+        targets, and submissions are dispatched fairly across assignments with
+        the closest due dates served first.
+
+        :param targets: List of dicts with course_id, assignment_id and optional profile.
+        :param canvas: Canvas client shared by every target.
+        :param global_concurrency: Submissions in flight across all targets.
+        :param assignment_concurrency: Submissions in flight for any one target.
+        """
+        self.targets = targets
+        self.canvas = canvas
+        self.token = token
+        self.ocr_processor = ocr_processor
+        self.feedback_gen = feedback_gen
+        self.sheet_logger = sheet_logger
+        self.job_store = job_store
+        self.state_store = state_store
+        self.downloader = downloader
+        self.global_concurrency = global_concurrency
+        self.assignment_concurrency = assignment_concurrency
+        self.pipelines = None
+        self.stages = None
+        # (assignment id, user id) currently being processed by a sweep or an event
+        self.in_flight = set()
+
+    def _load_pipelines(self):
+        courses = {}
+        pipelines = []
+        for target in self.targets:
+            course_id = target["course_id"]
+            if course_id not in courses:
+                courses[course_id] = self.canvas.get_course(course_id)
+            canvas_mgr = CanvasManager(
+                api_url=API_URL,
+                token=self.token,
+                course_id=course_id,
+                assignment_id=target["assignment_id"],
+                canvas=self.canvas,
+                course=courses[course_id]
+            )
+            pipeline = SubmissionPipeline(
+                canvas_mgr=canvas_mgr,
+                ocr_processor=self.ocr_processor,
+                feedback_gen=self.feedback_gen,
+                sheet_logger=self.sheet_logger,
+                job_store=self.job_store,
+                downloader=self.downloader,
+                stages=self.stages,
+                profile=target.get("profile", "auto")
+            )
+            # every target shares one downloader and its connection pool
+            self.downloader = pipeline.downloader
+            pipelines.append(pipeline)
+        return pipelines
+
+    @staticmethod
+    def _due_key(pipeline):
+        due_at = getattr(pipeline.canvas_mgr.assignment, "due_at", None)
+        return (due_at is None, due_at or "")
+
+    @staticmethod
+    def _interleave(selections):
+        # round robin across assignments, so no assignment waits behind another's whole class
+        rounds = itertools.zip_longest(*[[(p, s) for s in subs] for p, subs in selections])
+        return [item for batch in rounds for item in batch if item is not None]
+
+    async def _start(self):
+        loop = asyncio.get_running_loop()
+        if self.pipelines is None:
+            # Blocking client calls run in worker threads, so size the pool to fit every stage
+            loop.set_default_executor(ThreadPoolExecutor(max_workers=sum(STAGE_CONCURRENCY.values())))
+            warm_up()
+            self.stages = SubmissionPipeline.build_stages(STAGE_CONCURRENCY)
+            self.pipelines = await asyncio.to_thread(self._load_pipelines)
+            self.global_slots = asyncio.Semaphore(self.global_concurrency)
+            self.assignment_slots = {
+                p.assignment_id: asyncio.Semaphore(self.assignment_concurrency) for p in self.pipelines
+            }
+
+    async def run_once(self):
+        """
+        Selects and processes new or changed submissions for every target.
+        """
+        await self._start()
+        pipelines = sorted(self.pipelines, key=self._due_key)
+        selected = await asyncio.gather(
+            *(asyncio.to_thread(p.select_submissions, self.state_store) for p in pipelines)
+        )
+        selections = [(p, subs) for p, (subs, _) in zip(pipelines, selected)]
+        order = self._interleave(selections)
+        logging.info(f"Scheduling {len(order)} submissions across {len(pipelines)} assignments.")
+
+        flusher = asyncio.create_task(pipelines[0].flush_sheet_periodically()) if pipelines else None
+        try:
+            await asyncio.gather(*(p.resume_unlogged(self.in_flight) for p in pipelines))
+            # semaphores wake waiters in order, so tasks start in interleaved priority order
+            results = await asyncio.gather(*(self._dispatch(p, s) for p, s in order))
+        finally:
+            if flusher:
+                flusher.cancel()
+            await asyncio.to_thread(self.sheet_logger.close)
+
+        done = dict(zip((id(s) for _, s in order), results))
+        for (pipeline, subs), (_, fetch_started) in zip(selections, selected):
+            await asyncio.to_thread(
+                pipeline.record_results, self.state_store, subs, [done[id(s)] for s in subs], fetch_started
+            )
+        self.report_metrics()
+
+    @staticmethod
+    def report_metrics():
+        """
+        Logs and writes out everything recorded since the last report, then starts a
+        new window, so submissions processed between passes are still reported.
+        """
+        metrics = METRICS.rotate()
+        summary = metrics.summary()
+        for name, stats in summary["stages"].items():
+            logging.info(
+                f"Stage {name}: n={stats['count']} p50={stats['p50']:.2f}s "
+                f"p95={stats['p95']:.2f}s p99={stats['p99']:.2f}s"
+            )
+        cache = summary["prompt_cache"]
+        if cache["input_tokens"]:
+            logging.info(
+                f"Prompt cache: {cache['cached_input_tokens']} cached and {cache['uncached_input_tokens']} "
+                f"uncached input tokens ({cache['hit_ratio']:.0%} hit ratio)."
+            )
+            # repeated runs of one agent share its whole instruction prefix, so a miss on every call is a regression
+            requests = sum(counts.get("requests", 0) for counts in summary["usage"].values())
+            if requests > len(summary["usage"]) and not cache["cached_input_tokens"]:
+                logging.warning("No input tokens were served from the prompt cache; check the agent prompt prefix.")
+        logging.info(
+            f"Run processed {summary['submissions']} submissions in {summary['duration']:.1f}s, "
+            f"{summary['ocr_pages']} OCR pages, estimated cost ${summary['estimated_cost']:.2f}."
+        )
+        metrics.write_jsonl(METRICS_JSONL_PATH)
+        metrics.write_prometheus(METRICS_PROM_PATH)
+
+    async def _dispatch(self, pipeline, submission):
+        key = (pipeline.assignment_id, submission.user_id)
+        if key in self.in_flight:
+            # already being processed, so report it unfinished and let the next pass look again
+            return False
+        self.in_flight.add(key)
+        try:
+            async with self.assignment_slots[pipeline.assignment_id]:
+                async with self.global_slots:
+                    return await pipeline.process_submission(submission)
+        finally:
+            self.in_flight.discard(key)
+
+    async def handle_event(self, queue, assignment_id, user_id, attempt=None, tries=0):
+        """
+        Processes one student's submission straight after a submission event.
+        """
+        pipeline = next((p for p in self.pipelines if p.assignment_id == assignment_id), None)
+        if pipeline is None:
+            logging.debug(f"Ignoring event for untracked assignment {assignment_id}.")
+            return
+        try:
+            submission, not_visible = await asyncio.to_thread(
+                pipeline.select_submission, self.state_store, user_id, attempt
+            )
+            busy = (assignment_id, user_id) in self.in_flight
+            if (not_visible or busy) and tries < EVENT_MAX_RETRIES:
+                # Canvas has not caught up with the event yet, or an earlier attempt is still running
+                await asyncio.sleep(EVENT_RETRY_DELAY)
+                queue.put_nowait((assignment_id, user_id, attempt, tries + 1))
+                return
+            if submission is None or busy:
+                return
+            logging.info(f"Processing Student {user_id} on assignment {assignment_id} from a submission event.")
+            if await self._dispatch(pipeline, submission):
+                await asyncio.to_thread(self.state_store.record, [submission])
+        except Exception as e:
+            # the reconciliation sweep picks the submission up instead
+            logging.error(f"Submission event for Student {user_id} on assignment {assignment_id} failed: {e}")
+
+    async def serve_events(self, queue, reconcile_interval):
+        """
+        Processes submissions as their events arrive on queue, and runs a full pass
+        every reconcile_interval seconds to catch any event that was missed.
+
+        :param queue: asyncio.Queue of (assignment id, user id, attempt) tuples, or
+                      with a retry count as a fourth item.
+        """
+        await self._start()
+
+        async def reconcile():
+            while True:
+                try:
+                    await self.run_once()
+                except Exception as e:
+                    logging.error(f"Reconciliation sweep failed: {e}")
+                await asyncio.sleep(reconcile_interval)
+
+        async def report():
+            while True:
+                await asyncio.sleep(METRICS_REPORT_INTERVAL)
+                await asyncio.to_thread(self.report_metrics)
+
+        tasks = {asyncio.create_task(reconcile()), asyncio.create_task(report())}
+        if self.pipelines:
+            tasks.add(asyncio.create_task(self.pipelines[0].flush_sheet_periodically()))
+        try:
+            while True:
+                event = await queue.get()
+                task = asyncio.create_task(self.handle_event(queue, *event))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.to_thread(self.sheet_logger.close)
+
+    async def serve(self, interval):
+        """
+        Runs a pass over every target, then waits interval seconds, forever.
+        """
+        while True:
+            # nothing is recorded while idle, so each pass reports only its own time
+            METRICS.reset()
+            try:
+                await self.run_once()
+            except Exception as e:
+                logging.error(f"Scheduler pass failed: {e}")
+            await asyncio.sleep(interval)
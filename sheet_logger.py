@@ -0,0 +1,85 @@
+import os
+import json
+import time
+import logging
+import threading
+
+
+class SheetLogger:
+    def __init__(self, worksheet, journal_path, max_rows=25, max_delay=30):
+        """
+        Buffers feedback log rows and writes them to Google Sheets in batches.
+        Every row is journaled to a local file first, so rows that were not yet
+        written when the process stopped are replayed on the next run.
+
+        :param worksheet: gspread worksheet rows are appended to.
+        :param journal_path: Path to the local JSON lines journal.
+        :param max_rows: Flush once this many rows are buffered.
+        :param max_delay: Flush once the oldest buffered row is this many seconds old.
+        """
+        self.worksheet = worksheet
+        self.journal_path = journal_path
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._rows = []
+        self._oldest = None
+        if os.path.dirname(journal_path):
+            os.makedirs(os.path.dirname(journal_path), exist_ok=True)
+        self._replay()
+
+    def _replay(self):
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        if rows:
+            logging.info(f"Replaying {len(rows)} unwritten sheet rows from {self.journal_path}.")
+            self._rows = rows
+            self._oldest = time.monotonic()
+            self.flush()
+
+    def log(self, row):
+        """
+        Journals a row and buffers it, flushing if a threshold has been reached.
+        """
+        with self._lock:
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(row) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._rows.append(row)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+        self.flush_if_due()
+
+    def flush_if_due(self):
+        with self._lock:
+            due = self._rows and (
+                len(self._rows) >= self.max_rows or time.monotonic() - self._oldest >= self.max_delay
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes every buffered row with a single append_rows call. Rows stay in the
+        buffer and journal if the write fails, and are retried on the next flush.
+        """
+        with self._lock:
+            if not self._rows:
+                return
+            rows = list(self._rows)
+            try:
+                self.worksheet.append_rows(rows)
+            except Exception as e:
+                logging.warning(f"Error writing {len(rows)} rows to the sheet, will retry: {e}")
+                return
+            self._rows = []
+            self._oldest = None
+            # rows are in the sheet now, so the journal no longer needs them
+            open(self.journal_path, "w").close()
+        logging.info(f"Logged {len(rows)} rows to the sheet.")
+
+    def close(self):
+        self.flush()
@@ -0,0 +1,84 @@
+import os
+import sqlite3
+import threading
+
+from canvas_manager import CanvasManager
+
+
+class SubmissionStateStore:
+    def __init__(self, path):
+        """
+        Remembers the latest attempt, submitted_at and workflow_state seen for each
+        student, so each run only processes submissions that are new or changed.
+
+        :param path: Path to the SQLite database file.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS submissions (
+                    assignment_id INTEGER NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    attempt INTEGER,
+                    submitted_at TEXT,
+                    workflow_state TEXT,
+                    grade TEXT,
+                    PRIMARY KEY (assignment_id, user_id)
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS fetches (
+                    assignment_id INTEGER PRIMARY KEY,
+                    fetched_since TEXT NOT NULL
+                )
+            """)
+
+    @staticmethod
+    def _snapshot(submission):
+        history = submission.submission_history or []
+        latest = CanvasManager.get_latest_submission(history) if history else {}
+        return (
+            latest.get("attempt"),
+            latest.get("submitted_at"),
+            latest.get("workflow_state"),
+            latest.get("grade"),
+        )
+
+    def has_changed(self, submission):
+        """
+        :return: True if the submission is new or differs from the last recorded state.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT attempt, submitted_at, workflow_state, grade FROM submissions "
+                "WHERE assignment_id = ? AND user_id = ?",
+                (submission.assignment_id, submission.user_id)
+            ).fetchone()
+        return row != self._snapshot(submission)
+
+    def record(self, submissions):
+        """
+        Records the current state of submissions that no longer need processing.
+        """
+        rows = [(s.assignment_id, s.user_id, *self._snapshot(s)) for s in submissions]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO submissions VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def fetched_since(self, assignment_id):
+        """
+        :return: ISO 8601 timestamp to pass as submitted_since/graded_since, or None
+                 if the assignment has never been fetched.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fetched_since FROM fetches WHERE assignment_id = ?", (assignment_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_fetched_since(self, assignment_id, timestamp):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO fetches VALUES (?, ?)", (assignment_id, timestamp))
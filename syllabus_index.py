@@ -0,0 +1,146 @@
+import os
+import re
+import json
+import math
+import logging
+import threading
+
+from collections import Counter
+
+TOKEN = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)?")
+# Words too common in syllabus documents to say anything about relevance
+STOP_WORDS = frozenset(
+    "a an and are as at be by for from how in is it of on or that the this to was what which with".split()
+)
+DOCUMENT_EXTENSIONS = (".txt", ".md")
+# Longest excerpt kept per chunk, so one large paragraph cannot crowd out the rest of the prompt
+MAX_CHUNK_CHARS = 1200
+
+
+def tokenize(text):
+    return [t for t in TOKEN.findall(text.lower()) if t not in STOP_WORDS]
+
+
+class SyllabusIndex:
+    def __init__(self, docs_dir, index_path, k1=1.5, b=0.75):
+        """
+        Local BM25 index over syllabus outcomes, the directive verb glossary and
+        marking guidelines, so relevant excerpts can be put in the prompt instead of
+        the agent calling FileSearchTool against a remote vector store.
+
+        Documents are .txt or .md files in one subdirectory of docs_dir per
+        collection, mirroring the vector stores in agent.py (common, short_response,
+        long_response, hsc_music_1); files directly in docs_dir belong to common.
+        The index is rebuilt only when a document changes.
+
+        :param docs_dir: Directory holding one subdirectory of documents per collection.
+        :param index_path: Path of the precomputed JSON index.
+        :param k1: BM25 term frequency saturation.
+        :param b: BM25 document length normalization.
+        """
+        self.docs_dir = docs_dir
+        self.index_path = index_path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self.chunks = []
+        self.postings = {}
+        self.avg_length = 0.0
+        self.load()
+
+    def _fingerprint(self):
+        files = []
+        if os.path.isdir(self.docs_dir):
+            for root, _, names in os.walk(self.docs_dir):
+                for name in sorted(names):
+                    if name.lower().endswith(DOCUMENT_EXTENSIONS):
+                        path = os.path.join(root, name)
+                        stat = os.stat(path)
+                        files.append([os.path.relpath(path, self.docs_dir), stat.st_size, stat.st_mtime_ns])
+        return sorted(files)
+
+    def load(self):
+        """
+        Loads the index from index_path, rebuilding it if any document has changed.
+        """
+        fingerprint = self._fingerprint()
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data["fingerprint"] != fingerprint:
+                raise ValueError("Syllabus documents changed")
+        except (OSError, ValueError, KeyError):
+            data = self.build(fingerprint)
+        with self._lock:
+            self.chunks = data["chunks"]
+            self.postings = data["postings"]
+            self.avg_length = data["avg_length"]
+
+    def build(self, fingerprint=None):
+        """
+        Splits every document into paragraphs, indexes them and writes the index to disk.
+        """
+        fingerprint = fingerprint if fingerprint is not None else self._fingerprint()
+        chunks = []
+        postings = {}
+        for relpath, _, _ in fingerprint:
+            collection = relpath.split(os.sep)[0] if os.sep in relpath else "common"
+            with open(os.path.join(self.docs_dir, relpath), "r", encoding="utf-8") as f:
+                paragraphs = re.split(r"\n\s*\n", f.read())
+            for paragraph in paragraphs:
+                text = " ".join(paragraph.split())[:MAX_CHUNK_CHARS]
+                terms = tokenize(text)
+                if not terms:
+                    continue
+                chunk_id = len(chunks)
+                chunks.append({"collection": collection, "source": relpath, "text": text, "length": len(terms)})
+                for term, count in Counter(terms).items():
+                    postings.setdefault(term, []).append([chunk_id, count])
+
+        data = {
+            "fingerprint": fingerprint,
+            "chunks": chunks,
+            "postings": postings,
+            "avg_length": sum(c["length"] for c in chunks) / len(chunks) if chunks else 0.0,
+        }
+        if os.path.dirname(self.index_path):
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.index_path)
+        logging.info(f"Built syllabus index of {len(chunks)} excerpts from {len(fingerprint)} documents.")
+        return data
+
+    def search(self, query, collections=None, limit=5):
+        """
+        :param query: Free text, typically the question, outcomes and directive verb.
+        :param collections: Collection names to search, or None for all of them.
+        :param limit: Maximum number of excerpts returned.
+        :return: Matching chunk dicts (collection, source, text), best first.
+        """
+        with self._lock:
+            chunks, postings, avg_length = self.chunks, self.postings, self.avg_length
+        if not chunks:
+            return []
+
+        scores = Counter()
+        for term in set(tokenize(query)):
+            matches = postings.get(term)
+            if not matches:
+                continue
+            idf = math.log(1 + (len(chunks) - len(matches) + 0.5) / (len(matches) + 0.5))
+            for chunk_id, count in matches:
+                chunk = chunks[chunk_id]
+                if collections is not None and chunk["collection"] not in collections:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * chunk["length"] / avg_length)
+                scores[chunk_id] += idf * count * (self.k1 + 1) / (count + norm)
+        return [chunks[chunk_id] for chunk_id, _ in scores.most_common(limit)]
+
+
+if __name__ == "__main__":
+    from config import SYLLABUS_DIR, SYLLABUS_INDEX_PATH
+
+    logging.basicConfig(level=logging.INFO)
+    SyllabusIndex(SYLLABUS_DIR, SYLLABUS_INDEX_PATH).build()
@@ -0,0 +1,234 @@
+import re
+import difflib
+
+from enum import Enum
+from dataclasses import dataclass, field
+
+
+class UnknownResponseTypeError(Exception):
+    """Custom exception for unknown response types."""
+    pass
+
+
+class ResponseTypes(Enum):
+    LONG_RESPONSE = "long_response"
+    SHORT_RESPONSE = "short_response"
+
+
+class SubjectTypes(Enum):
+    GENERAL = "general"
+    HSC_MUSIC_1 = "hsc_music_1"
+
+
+# Only the top of the template is searched, so a stray mention in the body cannot misroute
+HEADER_LINES = 20
+# Minimum similarity for a fuzzy keyword match, tolerating a character or two of OCR error
+FUZZY_CUTOFF = 0.8
+# Lines with more words than this are answer text, never a template title
+TITLE_MAX_WORDS = 8
+# Most lines a question, subject or outcome list is allowed to wrap onto
+MAX_WRAPPED_LINES = 2
+
+# Template labels, normalized to lowercase letters only
+FIELD_LABELS = {
+    "studentname": "student_name",
+    "name": "student_name",
+    "subject": "subject",
+    "course": "subject",
+    "question": "question",
+    "directiveverb": "directive_verb",
+    "verb": "directive_verb",
+    "outcomes": "outcomes",
+    "syllabusoutcomes": "outcomes",
+    "responsetype": "response_type",
+    "type": "response_type",
+}
+RESPONSE_TYPE_PHRASES = {
+    "long response": ResponseTypes.LONG_RESPONSE,
+    "extended response": ResponseTypes.LONG_RESPONSE,
+    "short response": ResponseTypes.SHORT_RESPONSE,
+    "short answer": ResponseTypes.SHORT_RESPONSE,
+}
+
+# NESA glossary of key words
+DIRECTIVE_VERBS = (
+    "account", "analyse", "apply", "appreciate", "assess", "calculate", "clarify", "classify",
+    "compare", "construct", "contrast", "critically analyse", "critically evaluate", "deduce",
+    "define", "demonstrate", "describe", "discuss", "distinguish", "evaluate", "examine",
+    "explain", "extract", "extrapolate", "identify", "interpret", "investigate", "justify",
+    "outline", "predict", "propose", "recall", "recommend", "recount", "summarise", "synthesise",
+)
+
+LABEL_LINE = re.compile(r"^\s*([A-Za-z][A-Za-z ]{0,30}?)\s*[:\-–]\s*(.*)$")
+OUTCOME_CODE = re.compile(r"\b(?:[A-Z]{2,5}\d{1,2}-\d{1,2}|H\d{1,2}|P\d{1,2})\b")
+NON_LETTERS = re.compile(r"[^a-z]")
+WORDS = re.compile(r"[a-z0-9]+")
+VERB_PATTERN = re.compile(r"\b(" + "|".join(sorted(DIRECTIVE_VERBS, key=len, reverse=True)) + r")\b", re.IGNORECASE)
+
+
+@dataclass
+class SubmissionHeader:
+    subject: str = None
+    subject_type: SubjectTypes = SubjectTypes.GENERAL
+    question: str = None
+    response_type: ResponseTypes = None
+    student_name: str = None
+    directive_verb: str = None
+    outcomes: list = field(default_factory=list)
+    body: str = ""
+
+    @property
+    def routable(self):
+        return self.subject_type == SubjectTypes.HSC_MUSIC_1 or self.response_type is not None
+
+
+def fuzzy_contains(text, phrase, cutoff=FUZZY_CUTOFF):
+    """
+    True if any run of whole words in text is close to phrase, so "l0ng resp0nse"
+    still matches "long response" but "strong response" does not.
+    """
+    words = WORDS.findall(text)
+    phrase_words = phrase.split()
+    size = len(phrase_words)
+    for i in range(len(words) - size + 1):
+        window = words[i:i + size]
+        # numbers must match exactly, so "music 2" is never read as "music 1"
+        if any(p.isdigit() and w != p for w, p in zip(window, phrase_words)):
+            continue
+        # OCR swaps characters far more often than it adds or drops them
+        if any(abs(len(w) - len(p)) > 1 for w, p in zip(window, phrase_words)):
+            continue
+        if difflib.SequenceMatcher(None, " ".join(window), phrase).ratio() >= cutoff:
+            return True
+    return False
+
+
+def _match_label(label):
+    key = NON_LETTERS.sub("", label.lower())
+    if key in FIELD_LABELS:
+        return FIELD_LABELS[key]
+    close = difflib.get_close_matches(key, FIELD_LABELS, n=1, cutoff=FUZZY_CUTOFF)
+    if close and abs(len(close[0]) - len(key)) <= 1:
+        return FIELD_LABELS[close[0]]
+    return None
+
+
+def _match_response_type(text):
+    text = text.lower()
+    for phrase, response_type in RESPONSE_TYPE_PHRASES.items():
+        if fuzzy_contains(text, phrase):
+            return response_type
+    return None
+
+
+def _match_title(line):
+    """
+    Reads a template title line such as "Short Response - HSC Music 1".
+
+    :return: (response type, True if it names HSC Music 1), or None if the line is not a title.
+    """
+    lowered = line.lower()
+    if len(WORDS.findall(lowered)) > TITLE_MAX_WORDS or lowered.endswith("."):
+        return None
+    response_type = _match_response_type(lowered)
+    music = fuzzy_contains(lowered, "hsc music 1")
+    return (response_type, music) if response_type or music else None
+
+
+def _is_header_line(line):
+    match = LABEL_LINE.match(line)
+    return bool(match and _match_label(match.group(1))) or _match_title(line) is not None
+
+
+def _is_wrapped(name, line, next_line, wrapped):
+    """
+    True if line continues the value of the field labelled just above it. Subjects
+    are never wrapped, and a question only continues onto a line that starts in
+    lowercase or is followed by another header line, so the answer is never taken.
+    """
+    if wrapped >= MAX_WRAPPED_LINES:
+        return False
+    if name == "outcomes":
+        return bool(OUTCOME_CODE.match(line.lstrip("-•* ")))
+    if name == "question":
+        return line[0].islower() or (next_line is not None and _is_header_line(next_line))
+    return False
+
+
+def _set_field(header, name, value, wrapped=False):
+    if name == "outcomes":
+        header.outcomes.extend(OUTCOME_CODE.findall(value) or ([value] if value else []))
+    elif name == "response_type":
+        header.response_type = header.response_type or _match_response_type(value)
+    elif wrapped and getattr(header, name):
+        setattr(header, name, f"{getattr(header, name)} {value}")
+    elif value and not getattr(header, name):
+        setattr(header, name, value)
+
+
+def _next_line(lines, index):
+    return next((line.strip() for line in lines[index + 1:] if line.strip()), None)
+
+
+def parse_submission(text):
+    """
+    Parses the template header at the top of the OCR text in one pass. The header
+    ends at the first line that is neither a label, a line wrapped from the label
+    above it, nor a short title line; everything after it is the response body.
+
+    :param text: OCR text of the whole submission.
+    :return: SubmissionHeader with the fields found and the remaining response body.
+    """
+    lines = text.splitlines()
+    header = SubmissionHeader()
+    header_end = 0
+    seen = 0
+    current = None
+    wrapped = 0
+    for index, line in enumerate(lines):
+        line = line.strip()
+        if not line:
+            current = None
+            continue
+        if seen >= HEADER_LINES:
+            break
+        seen += 1
+
+        match = LABEL_LINE.match(line)
+        name = _match_label(match.group(1)) if match else None
+        title = None if name else _match_title(line)
+        if name:
+            _set_field(header, name, match.group(2).strip())
+            current, wrapped = name, 0
+        elif title:
+            response_type, music = title
+            header.response_type = header.response_type or response_type
+            if music:
+                header.subject_type = SubjectTypes.HSC_MUSIC_1
+            current = None
+        elif current and _is_wrapped(current, line, _next_line(lines, index), wrapped):
+            _set_field(header, current, line, wrapped=True)
+            wrapped += 1
+        else:
+            break
+        header_end = index + 1
+
+    if header.subject and fuzzy_contains(header.subject.lower(), "music 1"):
+        header.subject_type = SubjectTypes.HSC_MUSIC_1
+    if header.directive_verb is None and header.question:
+        verb = VERB_PATTERN.search(header.question)
+        header.directive_verb = verb.group(1).capitalize() if verb else None
+    header.body = "\n".join(lines[header_end:]).strip()
+    return header
+
+
+def parse_routable_submission(text):
+    """
+    Parses the header and rejects submissions that cannot be routed to an agent.
+
+    :raises UnknownResponseTypeError: if no response type or Music 1 subject is found.
+    """
+    header = parse_submission(text)
+    if not header.routable:
+        raise UnknownResponseTypeError("No response type found in the template header.")
+    return header
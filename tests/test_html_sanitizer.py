@@ -0,0 +1,15 @@
+from html_sanitizer import sanitize_html
+
+
+def test_void_embed_keeps_following_content():
+    html = '<p>a</p><embed src=x><h2>Final Summary</h2><p>rest</p>'
+    assert sanitize_html(html) == '<p>a</p><h2>Final Summary</h2><p>rest</p>'
+
+
+def test_script_content_dropped():
+    assert sanitize_html('<p>a</p><script>alert(1)</script><p>b</p>') == '<p>a</p><p>b</p>'
+
+
+def test_superscripts_subscripts_and_code_kept():
+    html = '<p>6.02 x 10<sup>23</sup> molecules of H<sub>2</sub>O, see <code>pH</code></p>'
+    assert sanitize_html(html) == html
@@ -0,0 +1,78 @@
+from template_parser import ResponseTypes, SubjectTypes, parse_submission
+
+
+def test_body_phrase_does_not_set_response_type():
+    header = parse_submission(
+        "Student Name: Jo Citizen\n"
+        "Subject: Biology\n"
+        "Question: Explain the role of enzymes.\n"
+        "Enzymes are biological catalysts.\n"
+        "A strong response would mention denaturation.\n"
+    )
+    assert header.response_type is None
+    assert header.body == "Enzymes are biological catalysts.\nA strong response would mention denaturation."
+
+
+def test_wrapped_question_stays_in_question():
+    header = parse_submission(
+        "Short Response\n"
+        "Subject: Biology\n"
+        "Question: Explain how enzyme activity is affected by\n"
+        "temperature and pH. (6 marks)\n"
+        "Enzymes are proteins, so heat changes their shape.\n"
+    )
+    assert header.response_type == ResponseTypes.SHORT_RESPONSE
+    assert header.question == "Explain how enzyme activity is affected by temperature and pH. (6 marks)"
+    assert header.directive_verb == "Explain"
+    assert header.body == "Enzymes are proteins, so heat changes their shape."
+
+
+def test_music_1_mention_in_body_keeps_body():
+    header = parse_submission(
+        "Long Response\n"
+        "Subject: Music\n"
+        "Question: Discuss the use of texture in the piece.\n"
+        "In HSC Music 1 we studied how texture builds tension.\n"
+        "The strings enter one at a time.\n"
+    )
+    assert header.response_type == ResponseTypes.LONG_RESPONSE
+    assert header.subject_type == SubjectTypes.GENERAL
+    assert header.body == "In HSC Music 1 we studied how texture builds tension.\nThe strings enter one at a time."
+
+
+def test_music_1_title_routes_without_response_type():
+    header = parse_submission("HSC Music 1 - Aural Skills\nOutcomes:\n- H1 performs\nH2, H3\nThe melody rises.")
+    assert header.subject_type == SubjectTypes.HSC_MUSIC_1
+    assert header.outcomes == ["H1", "H2", "H3"]
+    assert header.body == "The melody rises."
+
+
+def test_unpunctuated_subject_keeps_answer_in_body():
+    header = parse_submission("Short Response\nName: Jo\nSubject: Biology\nEnzymes are proteins.\nThey lower activation energy")
+    assert header.subject == "Biology"
+    assert header.body == "Enzymes are proteins.\nThey lower activation energy"
+
+
+def test_unpunctuated_question_keeps_answer_in_body():
+    header = parse_submission(
+        "Short Response\n"
+        "Subject: Biology\n"
+        "Question: Explain the effect of temperature on enzymes\n"
+        "Enzymes denature above their optimum.\n"
+        "The active site changes shape"
+    )
+    assert header.question == "Explain the effect of temperature on enzymes"
+    assert header.body == "Enzymes denature above their optimum.\nThe active site changes shape"
+
+
+def test_question_wrapped_before_another_label():
+    header = parse_submission(
+        "Short Response\n"
+        "Question: Explain the effect of temperature on\n"
+        "Enzyme activity. (4 marks)\n"
+        "Subject: Biology\n"
+        "Enzymes denature above their optimum."
+    )
+    assert header.question == "Explain the effect of temperature on Enzyme activity. (4 marks)"
+    assert header.subject == "Biology"
+    assert header.body == "Enzymes denature above their optimum."